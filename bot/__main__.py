@@ -9,7 +9,7 @@ import asyncpg
 from dotenv import load_dotenv
 from rich.logging import RichHandler
 from bot.core import Bot
-from bot.core.rate_limiter import DynamicRateLimiter
+from bot.core.rate_limiter import DynamicRateLimiter, MemoryBackend, RedisBackend
 
 load_dotenv()
 
@@ -61,7 +61,12 @@ async def cleanup_pycache():
 async def main():
     async with Bot() as bot:
         bot.pool = await initialize_database()
-        bot.rate_limiter = DynamicRateLimiter(bot.pool)
+        backend = (
+            RedisBackend(bot.redis)
+            if environ.get("RATE_LIMIT_BACKEND", "memory") == "redis"
+            else MemoryBackend()
+        )
+        bot.rate_limiter = DynamicRateLimiter(bot.pool, backend)
         
         asyncio.create_task(cleanup_pycache())
         
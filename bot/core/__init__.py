@@ -7,7 +7,7 @@ import logging
 import discord
 import aiohttp
 
-from typing import List, Optional, cast
+from typing import List, Optional
 from discord import (
     ClientUser,
     Color,
@@ -58,6 +58,10 @@ from psutil._common import bytes2human as humanize_bytes
 
 from .context import Context, HelpCommand
 from .rate_limiter import DynamicRateLimiter
+from .prefix_cache import PrefixCache
+from .blacklist import Blacklist
+from .throttle import Throttle
+from .member_index import JoinIndex, NameIndex
 
 from cashews import cache
 
@@ -118,7 +122,12 @@ class Bot(AutoShardedBot):
     session: ClientSession
     user: ClientUser
     rate_limiter: DynamicRateLimiter
-    cooldown_manager = CooldownManager()
+    prefixes: PrefixCache
+    blacklist: Blacklist
+    throttle = Throttle()
+    cooldown_manager = CooldownManager(throttle)
+    join_index = JoinIndex()
+    name_index = NameIndex()
 
     def __init__(self) -> None:
         super().__init__(
@@ -145,6 +154,8 @@ class Bot(AutoShardedBot):
         import redis.asyncio as redis
         self.redis = redis.Redis(host='localhost', port=6379, db=0)
         self.session = None
+        self.prefixes = PrefixCache()
+        self.blacklist = Blacklist()
         self.add_check(global_permission_check)
 
     async def startup(self):
@@ -154,6 +165,9 @@ class Bot(AutoShardedBot):
             })
 
     async def close(self):
+        await self.blacklist.close()
+        if hasattr(self, 'rate_limiter'):
+            await self.rate_limiter.close()
         await self.session.close()
         await super().close()
 
@@ -212,33 +226,38 @@ class Bot(AutoShardedBot):
         if not message.guild:
             return when_mentioned(bot, message)
 
-        query = """
-        SELECT (
-            SELECT prefix
-            FROM config
-            WHERE guild_id = $1
-        ) AS guild_prefix,
-        (
-            SELECT prefix
-            FROM user_config
-            WHERE user_id = $2
-        ) AS user_prefix
-        """
-        record = await bot.pool.fetchrow(query, message.guild.id, message.author.id)
-        prefixes = {record["guild_prefix"] or "-"}
-        if record["user_prefix"]:
-            prefixes.add(record["user_prefix"])
-
+        prefixes = await bot.prefixes.prefixes(message.guild.id, message.author.id)
         return when_mentioned_or(*prefixes)(bot, message)
 
     async def setup_hook(self) -> None:
         self.session = ClientSession()
         self.tree.interaction_check = self.blacklist_check
+        await self.prefixes.load(self.pool)
+        await self.blacklist.load(self.pool)
+        await self.blacklist.subscribe(self.prefixes.channel, self.prefixes.on_notify, self.prefixes.reload)
+        if hasattr(self, 'rate_limiter'):
+            await self.rate_limiter.start()
 
     async def on_ready(self) -> None:
         logging.info(f"Logged in as {self.user}")
         await self.load_extensions()
 
+    async def on_member_join(self, member: discord.Member) -> None:
+        self.join_index.add(member)
+        self.name_index.add(member)
+
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.join_index.remove(member)
+        self.name_index.remove(member)
+
+    async def on_user_update(self, before: discord.User, after: discord.User) -> None:
+        if before.name != after.name:
+            self.name_index.rename(before, after)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.join_index.discard(guild.id)
+        self.name_index.discard(guild.id)
+
     async def load_extensions(self):
         await self.load_extension("jishaku")
         for extension in Path("bot/extensions").glob("*"):
@@ -259,14 +278,7 @@ class Bot(AutoShardedBot):
                 logging.info(f"Loaded extension {package}")
 
     async def is_blacklisted(self, target_ids: List[int]) -> bool:
-        query = """
-        SELECT EXISTS(
-            SELECT 1
-            FROM blacklist
-            WHERE target_id = ANY($1::BIGINT[])
-        )
-        """
-        return cast(bool, await self.pool.fetchval(query, target_ids))
+        return self.blacklist.any(target_ids)
 
     async def blacklist_check(self, interaction: Interaction):
         if not interaction.guild_id:
@@ -277,28 +289,10 @@ class Bot(AutoShardedBot):
             interaction.user.id,
         ])
         if blacklisted:
-            if hasattr(self, 'rate_limiter'):
-                blacklist_category = "blacklist_notification"
-                
-                query = """
-                SELECT last_used FROM user_rate_limits
-                WHERE user_id = $1 AND guild_id = $2 AND command_category = $3
-                """
-                record = await self.pool.fetchrow(query, interaction.user.id, interaction.guild_id, blacklist_category)
-                
-                if record and record['last_used']:
-                    from datetime import datetime, timezone
-                    time_since_last = (datetime.now(timezone.utc) - record['last_used']).total_seconds()
-                    if time_since_last < 30.0:
-                        return False
-                
-                await self.pool.execute("""
-                    INSERT INTO user_rate_limits (user_id, guild_id, command_category, last_used)
-                    VALUES ($1, $2, $3, NOW())
-                    ON CONFLICT (user_id, guild_id, command_category)
-                    DO UPDATE SET last_used = NOW()
-                """, interaction.user.id, interaction.guild_id, blacklist_category)
-            
+            key = ("blacklist_notification", interaction.user.id, interaction.guild_id)
+            if not self.throttle.allow(key, 30.0):
+                return False
+
             await interaction.response.send_message(
                 "You are blacklisted from using this bot",
                 ephemeral=True,
@@ -316,6 +310,17 @@ class Bot(AutoShardedBot):
         return await super().get_context(origin, cls=Context)
 
     async def process_commands(self, message: Message):
+        if not message.guild or message.author.bot:
+            return
+
+        if not self.prefixes.match(
+            message.guild.id,
+            message.author.id,
+            message.content,
+            (f"<@{self.user.id}>", f"<@!{self.user.id}>"),
+        ):
+            return
+
         ctx = await self.get_context(message)
 
         if not all((ctx.guild, ctx.channel, not ctx.author.bot)):
@@ -331,35 +336,15 @@ class Bot(AutoShardedBot):
         async def process():
             # Handle mention for prefix display first, before checking ctx.valid
             if message.content == self.user.mention:
-                prefix_category = "prefix_mention"
-
-                query = """
-                SELECT last_used FROM user_rate_limits
-                WHERE user_id = $1 AND guild_id = $2 AND command_category = $3
-                """
-                record = await self.pool.fetchrow(query, ctx.author.id, ctx.guild.id, prefix_category)
-
-                if record and record['last_used']:
-                    from datetime import datetime, timezone
-                    time_since_last = (datetime.now(timezone.utc) - record['last_used']).total_seconds()
-                    if time_since_last < 10.0:
-                        return
+                key = ("prefix_mention", ctx.author.id, ctx.guild.id)
+                if not self.throttle.allow(key, 10.0):
+                    return
 
-                await self.pool.execute("""
-                    INSERT INTO user_rate_limits (user_id, guild_id, command_category, last_used)
-                    VALUES ($1, $2, $3, NOW())
-                    ON CONFLICT (user_id, guild_id, command_category)
-                    DO UPDATE SET last_used = NOW()
-                """, ctx.author.id, ctx.guild.id, prefix_category)
-
-                user_query = "SELECT prefix FROM user_config WHERE user_id = $1;"
-                user_row = await self.pool.fetchrow(user_query, ctx.author.id)
-                if user_row:
-                    prefix = user_row["prefix"]
-                else:
-                    guild_query = "SELECT prefix FROM config WHERE guild_id = $1;"
-                    guild_row = await self.pool.fetchrow(guild_query, ctx.guild.id)
-                    prefix = guild_row["prefix"] if guild_row else "-"
+                prefix = (
+                    await self.prefixes.user(ctx.author.id)
+                    or await self.prefixes.guild(ctx.guild.id)
+                    or "-"
+                )
 
                 embed = Embed(
                     color=0xacacac,
@@ -383,15 +368,9 @@ class Bot(AutoShardedBot):
             if hasattr(self, 'rate_limiter'):
                 can_execute, remaining_time = await self.rate_limiter.check_rate_limit(ctx)
                 if not can_execute:
-                    cooldown_seconds = 5
-                    key = (ctx.author.id, ctx.command.qualified_name)
-                    last_warn = getattr(self.cooldown_manager, "warn_cache", {}).get(key)
-
-                    from datetime import datetime, timezone
-                    now = datetime.now(timezone.utc)
-
-                    if not last_warn or (now - last_warn).total_seconds() > cooldown_seconds:
-                        self.cooldown_manager.warn_cache[key] = now
+                    if self.cooldown_manager.should_send_cooldown_warning(
+                        ctx.author.id, ctx.command.qualified_name, 5
+                    ):
                         return await ctx.warn(
                             f"You're being rate limited. Try again in **{int(remaining_time)} seconds**"
                         )
@@ -412,27 +391,10 @@ class Bot(AutoShardedBot):
         ):
             return
 
-        if hasattr(self, 'rate_limiter') and ctx.guild:
-            error_category = "error_handling"
-            
-            query = """
-            SELECT last_used FROM user_rate_limits
-            WHERE user_id = $1 AND guild_id = $2 AND command_category = $3
-            """
-            record = await self.pool.fetchrow(query, ctx.author.id, ctx.guild.id, error_category)
-            
-            if record and record['last_used']:
-                from datetime import datetime, timezone
-                time_since_last = (datetime.now(timezone.utc) - record['last_used']).total_seconds()
-                if time_since_last < 5.0:
-                    return 
-            
-            await self.pool.execute("""
-                INSERT INTO user_rate_limits (user_id, guild_id, command_category, last_used)
-                VALUES ($1, $2, $3, NOW())
-                ON CONFLICT (user_id, guild_id, command_category)
-                DO UPDATE SET last_used = NOW()
-            """, ctx.author.id, ctx.guild.id, error_category)
+        if ctx.guild and not self.throttle.allow(
+            ("error_handling", ctx.author.id, ctx.guild.id), 5.0
+        ):
+            return
 
         if isinstance(
             exception,
@@ -0,0 +1,145 @@
+import asyncio
+from logging import getLogger
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+import asyncpg
+
+logger = getLogger(__name__)
+
+
+class Blacklist:
+    """
+    Memory-resident copy of the ``blacklist`` table.
+
+    The table is loaded once on startup and kept in sync through the
+    developer commands. Every change is broadcast with ``pg_notify`` so
+    that other processes sharing the database update their own copy.
+
+    Listening permanently holds one connection from the pool. If Postgres
+    drops it, a new one is acquired, the channel is listened to again and
+    the table is reloaded to pick up anything missed in between. Other
+    caches can listen on the same connection through ``subscribe``.
+    """
+
+    channel = "blacklist"
+    retry_delay = 5.0
+
+    def __init__(self):
+        self.pool: Optional[asyncpg.Pool] = None
+        self.targets: set[int] = set()
+        self._connection: Optional[asyncpg.Connection] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        # channel -> (notification callback, reload after a reconnect)
+        self._subscriptions: Dict[str, Tuple[Callable, Optional[Callable[[], Awaitable[None]]]]] = {}
+
+    def __contains__(self, target_id: int) -> bool:
+        return target_id in self.targets
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def any(self, target_ids: Iterable[int]) -> bool:
+        return not self.targets.isdisjoint(target_ids)
+
+    async def load(self, pool: asyncpg.Pool) -> None:
+        self.pool = pool
+        # Listen before reading so no change can slip in between.
+        if not self._connection:
+            connection = await pool.acquire()
+            try:
+                await connection.add_listener(self.channel, self._on_notify)
+                for channel, (callback, _) in self._subscriptions.items():
+                    await connection.add_listener(channel, callback)
+            except Exception:
+                await pool.release(connection)
+                raise
+            connection.add_termination_listener(self._on_terminate)
+            self._connection = connection
+
+        records = await pool.fetch("SELECT target_id FROM blacklist")
+        self.targets = {record["target_id"] for record in records}
+
+        logger.info(f"Loaded {len(self.targets)} blacklisted targets")
+
+    async def subscribe(
+        self,
+        channel: str,
+        callback: Callable,
+        reload: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> None:
+        """
+        Listen to another channel on the blacklist's connection. ``reload``
+        runs after a reconnect so the subscriber can catch up on anything
+        it missed.
+        """
+
+        self._subscriptions[channel] = (callback, reload)
+        if self._connection:
+            await self._connection.add_listener(channel, callback)
+
+    async def close(self) -> None:
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+        if self._connection and self.pool:
+            self._connection.remove_termination_listener(self._on_terminate)
+            await self._connection.remove_listener(self.channel, self._on_notify)
+            for channel, (callback, _) in self._subscriptions.items():
+                await self._connection.remove_listener(channel, callback)
+            await self.pool.release(self._connection)
+            self._connection = None
+
+    def _on_terminate(self, connection: asyncpg.Connection) -> None:
+        if connection is not self._connection:
+            return
+
+        self._connection = None
+        if self.pool and not self.pool.is_closing():
+            logger.warning("Blacklist listener connection was lost, reconnecting")
+            self._reconnect_task = asyncio.create_task(self._reconnect(connection))
+
+    async def _reconnect(self, lost: asyncpg.Connection) -> None:
+        # The pool replaces a closed connection once it is released.
+        try:
+            await self.pool.release(lost)
+        except Exception:
+            pass
+
+        while self.pool and not self.pool.is_closing():
+            try:
+                await self.load(self.pool)
+                for _, reload in self._subscriptions.values():
+                    if reload:
+                        await reload()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                logger.warning(f"Failed to restore blacklist listener: {exc}")
+                await asyncio.sleep(self.retry_delay)
+            else:
+                break
+
+        self._reconnect_task = None
+
+    def _on_notify(self, _connection, _pid: int, _channel: str, payload: str) -> None:
+        action, _, target_id = payload.partition(":")
+        if not target_id.isdigit():
+            return
+
+        if action == "add":
+            self.targets.add(int(target_id))
+        elif action == "remove":
+            self.targets.discard(int(target_id))
+
+    async def _notify(self, action: str, target_id: int) -> None:
+        if self.pool:
+            await self.pool.execute(
+                "SELECT pg_notify($1, $2)", self.channel, f"{action}:{target_id}"
+            )
+
+    async def add(self, target_id: int) -> None:
+        self.targets.add(target_id)
+        await self._notify("add", target_id)
+
+    async def remove(self, target_id: int) -> None:
+        self.targets.discard(target_id)
+        await self._notify("remove", target_id)
@@ -1,32 +1,60 @@
-import time
-from datetime import datetime
-from collections import defaultdict
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional
+
+from .throttle import Throttle
 
 class CooldownManager:
-    def __init__(self):
-        # Stores the timestamps of last event triggers by event name
-        self.cooldowns = defaultdict(float)
-        # Stores last warning timestamp per user+command to prevent spam
-        self.warn_cache: dict[tuple[int, str], datetime] = {}
+    def __init__(
+        self,
+        throttle: Optional[Throttle] = None,
+        *,
+        max_age: float = 3600.0,
+        maxsize: int = 50_000,
+    ):
+        # Monotonic timestamps of last event triggers by event name, oldest
+        # first. Triggers older than ``max_age`` can no longer be on cooldown
+        # and are evicted from the front, as are the oldest past ``maxsize``.
+        self.cooldowns: OrderedDict[str, float] = OrderedDict()
+        self.max_age = max_age
+        self.maxsize = maxsize
+        self.evictions = 0
+        # Suppresses repeated cooldown warnings per user+command
+        self.throttle = throttle or Throttle()
+
+    def __len__(self) -> int:
+        return len(self.cooldowns)
+
+    def _evict(self, now: float) -> None:
+        while self.cooldowns:
+            event_name, triggered = next(iter(self.cooldowns.items()))
+            if now - triggered < self.max_age and len(self.cooldowns) <= self.maxsize:
+                break
+            del self.cooldowns[event_name]
+            self.evictions += 1
 
     def is_on_cooldown(self, event_name: str, cooldown_time: float) -> bool:
-        current_time = time.time()
-        return current_time - self.cooldowns[event_name] < cooldown_time
+        return self.get_time_remaining(event_name, cooldown_time) > 0
 
     def apply_cooldown(self, event_name: str) -> None:
-        self.cooldowns[event_name] = time.time()
+        now = monotonic()
+        self.cooldowns[event_name] = now
+        self.cooldowns.move_to_end(event_name)
+        self._evict(now)
 
     def get_time_remaining(self, event_name: str, cooldown_time: float) -> float:
-        current_time = time.time()
-        elapsed_time = current_time - self.cooldowns[event_name]
-        return max(cooldown_time - elapsed_time, 0)
+        triggered = self.cooldowns.get(event_name)
+        if triggered is None:
+            return 0
+        return max(cooldown_time - (monotonic() - triggered), 0)
 
     def should_send_cooldown_warning(self, user_id: int, command_name: str, cooldown_seconds: float) -> bool:
-        now = datetime.utcnow()
-        key = (user_id, command_name)
-        last_sent = self.warn_cache.get(key)
-
-        if not last_sent or (now - last_sent).total_seconds() > cooldown_seconds:
-            self.warn_cache[key] = now
-            return True
-        return False
\ No newline at end of file
+        return self.throttle.allow(("cooldown_warning", user_id, command_name), cooldown_seconds)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "cooldowns": len(self.cooldowns),
+            "cooldown_evictions": self.evictions,
+            "warnings": len(self.throttle),
+            "warning_evictions": self.throttle.evictions,
+        }
@@ -0,0 +1,136 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+# (joined_at timestamp, member_id); members without a join date sort last.
+JoinKey = Tuple[float, int]
+
+
+def join_key(member: discord.Member) -> JoinKey:
+    joined = member.joined_at.timestamp() if member.joined_at else float("inf")
+    return (joined, member.id)
+
+
+class GuildJoins:
+    __slots__ = ("keys", "members")
+
+    def __init__(self, members):
+        self.members: Dict[int, JoinKey] = {member.id: join_key(member) for member in members}
+        self.keys: List[JoinKey] = sorted(self.members.values())
+
+    def add(self, member: discord.Member) -> None:
+        self.remove(member.id)
+        key = self.members[member.id] = join_key(member)
+        insort(self.keys, key)
+
+    def remove(self, member_id: int) -> None:
+        if key := self.members.pop(member_id, None):
+            del self.keys[bisect_left(self.keys, key)]
+
+    def position(self, member_id: int) -> Optional[int]:
+        if not (key := self.members.get(member_id)):
+            return None
+        return bisect_left(self.keys, key) + 1
+
+
+class JoinIndex:
+    """
+    Members of recently used guilds sorted by join date.
+
+    A guild is sorted once, the first time a join position is asked for
+    after it has been chunked. The bot then keeps it current from member
+    join and remove events. At most ``maxsize`` guilds are indexed, and
+    the least recently used is dropped first.
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self.guilds: OrderedDict[int, GuildJoins] = OrderedDict()
+
+    def _get(self, guild: discord.Guild) -> GuildJoins:
+        if (joins := self.guilds.get(guild.id)) is not None:
+            self.guilds.move_to_end(guild.id)
+            return joins
+
+        joins = GuildJoins(guild.members)
+        # An unchunked member list is incomplete and would go stale.
+        if guild.chunked:
+            self.guilds[guild.id] = joins
+            while len(self.guilds) > self.maxsize:
+                self.guilds.popitem(last=False)
+        return joins
+
+    def position(self, guild: discord.Guild, member_id: int) -> Optional[int]:
+        return self._get(guild).position(member_id)
+
+    def add(self, member: discord.Member) -> None:
+        if (joins := self.guilds.get(member.guild.id)) is not None:
+            joins.add(member)
+
+    def remove(self, member: discord.Member) -> None:
+        if (joins := self.guilds.get(member.guild.id)) is not None:
+            joins.remove(member.id)
+
+    def discard(self, guild_id: int) -> None:
+        self.guilds.pop(guild_id, None)
+
+
+class NameIndex:
+    """
+    Username -> member id for recently used, chunked guilds.
+
+    A guild is indexed the first time a name is looked up in it and is
+    then kept current from member join, remove and username change
+    events. Guilds that are not chunked yet fall back to scanning the
+    member list. At most ``maxsize`` guilds are indexed, and the least
+    recently used is dropped first.
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self.guilds: OrderedDict[int, Dict[str, int]] = OrderedDict()
+
+    def _get(self, guild: discord.Guild) -> Optional[Dict[str, int]]:
+        if (names := self.guilds.get(guild.id)) is not None:
+            self.guilds.move_to_end(guild.id)
+            return names
+        if not guild.chunked:
+            return None
+
+        names = self.guilds[guild.id] = {}
+        for member in guild.members:
+            names.setdefault(member.name, member.id)
+        while len(self.guilds) > self.maxsize:
+            self.guilds.popitem(last=False)
+        return names
+
+    def find(self, guild: discord.Guild, name: str) -> Optional[discord.Member]:
+        names = self._get(guild)
+        if names is None:
+            return discord.utils.find(lambda m: m.name == name, guild.members)
+
+        member = guild.get_member(names.get(name, 0))
+        return member if member and member.name == name else None
+
+    def add(self, member: discord.Member) -> None:
+        if (names := self.guilds.get(member.guild.id)) is not None:
+            names.setdefault(member.name, member.id)
+
+    def remove(self, member: discord.Member) -> None:
+        names = self.guilds.get(member.guild.id)
+        if names is not None and names.get(member.name) == member.id:
+            del names[member.name]
+
+    def rename(self, before: discord.User, after: discord.User) -> None:
+        for guild in after.mutual_guilds:
+            names = self.guilds.get(guild.id)
+            if names is None:
+                continue
+            if names.get(before.name) == after.id:
+                del names[before.name]
+            names.setdefault(after.name, after.id)
+
+    def discard(self, guild_id: int) -> None:
+        self.guilds.pop(guild_id, None)
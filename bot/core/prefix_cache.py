@@ -0,0 +1,170 @@
+from collections import Counter, OrderedDict
+from typing import Optional, Sequence
+
+import asyncpg
+
+DEFAULT_PREFIX = "-"
+
+
+class PrefixCache:
+    """
+    Bounded in-memory store of guild and user prefixes.
+
+    Both maps are warmed from Postgres on startup and kept current by the
+    prefix commands, so resolving a prefix needs no round trip. A miss only
+    reaches the database when the table did not fit in the cache, and the
+    result (including "no prefix") is remembered.
+
+    User prefixes apply in every guild, so ``update_user`` also broadcasts
+    the change with ``pg_notify`` for processes serving other shards.
+    """
+
+    channel = "user_prefixes"
+
+    def __init__(self, maxsize: int = 250_000):
+        self.pool: Optional[asyncpg.Pool] = None
+        self.maxsize = maxsize
+        self.guilds: OrderedDict[int, Optional[str]] = OrderedDict()
+        self.users: OrderedDict[int, Optional[str]] = OrderedDict()
+        # True while every row of the table is held in memory,
+        # in which case a miss means the row does not exist.
+        self.guilds_complete = False
+        self.users_complete = False
+        # Outcomes of the pre-filter in ``match``.
+        self.stats: Counter[str] = Counter()
+
+    async def load(self, pool: asyncpg.Pool) -> None:
+        self.pool = pool
+        self.guilds.clear()
+        self.users.clear()
+
+        records = await pool.fetch(
+            "SELECT guild_id, prefix FROM config WHERE prefix IS NOT NULL LIMIT $1",
+            self.maxsize + 1,
+        )
+        for record in records[: self.maxsize]:
+            self.guilds[record["guild_id"]] = record["prefix"]
+        self.guilds_complete = len(records) <= self.maxsize
+
+        records = await pool.fetch(
+            "SELECT user_id, prefix FROM user_config WHERE prefix IS NOT NULL LIMIT $1",
+            self.maxsize + 1,
+        )
+        for record in records[: self.maxsize]:
+            self.users[record["user_id"]] = record["prefix"]
+        self.users_complete = len(records) <= self.maxsize
+
+    def _store(self, store: OrderedDict, key: int, value: Optional[str]) -> bool:
+        store[key] = value
+        store.move_to_end(key)
+        if len(store) > self.maxsize:
+            store.popitem(last=False)
+            return True
+        return False
+
+    def peek_guild(self, guild_id: int) -> tuple[bool, Optional[str]]:
+        """Return ``(known, prefix)`` without touching the database."""
+
+        if guild_id in self.guilds:
+            self.guilds.move_to_end(guild_id)
+            return True, self.guilds[guild_id]
+        return self.guilds_complete, None
+
+    def peek_user(self, user_id: int) -> tuple[bool, Optional[str]]:
+        """Return ``(known, prefix)`` without touching the database."""
+
+        if user_id in self.users:
+            self.users.move_to_end(user_id)
+            return True, self.users[user_id]
+        return self.users_complete, None
+
+    async def guild(self, guild_id: int) -> Optional[str]:
+        known, prefix = self.peek_guild(guild_id)
+        if known or not self.pool:
+            return prefix
+
+        prefix = await self.pool.fetchval(
+            "SELECT prefix FROM config WHERE guild_id = $1", guild_id
+        )
+        self.set_guild(guild_id, prefix)
+        return prefix
+
+    async def user(self, user_id: int) -> Optional[str]:
+        known, prefix = self.peek_user(user_id)
+        if known or not self.pool:
+            return prefix
+
+        prefix = await self.pool.fetchval(
+            "SELECT prefix FROM user_config WHERE user_id = $1", user_id
+        )
+        self.set_user(user_id, prefix)
+        return prefix
+
+    def set_guild(self, guild_id: int, prefix: Optional[str]) -> None:
+        if self.guilds_complete and prefix is None:
+            self.guilds.pop(guild_id, None)
+        elif self._store(self.guilds, guild_id, prefix):
+            self.guilds_complete = False
+
+    def set_user(self, user_id: int, prefix: Optional[str]) -> None:
+        if self.users_complete and prefix is None:
+            self.users.pop(user_id, None)
+        elif self._store(self.users, user_id, prefix):
+            self.users_complete = False
+
+    async def update_user(self, user_id: int, prefix: Optional[str]) -> None:
+        """Apply a stored user prefix change here and in every other process."""
+
+        self.set_user(user_id, prefix)
+        if self.pool:
+            await self.pool.execute(
+                "SELECT pg_notify($1, $2)", self.channel, f"{user_id}:{prefix or ''}"
+            )
+
+    def on_notify(self, _connection, _pid: int, _channel: str, payload: str) -> None:
+        user_id, _, prefix = payload.partition(":")
+        if user_id.isdigit():
+            self.set_user(int(user_id), prefix or None)
+
+    async def reload(self) -> None:
+        if self.pool:
+            await self.load(self.pool)
+
+    async def prefixes(self, guild_id: int, user_id: int) -> set[str]:
+        prefixes = {await self.guild(guild_id) or DEFAULT_PREFIX}
+        if user_prefix := await self.user(user_id):
+            prefixes.add(user_prefix)
+        return prefixes
+
+    def match(
+        self,
+        guild_id: int,
+        user_id: int,
+        content: str,
+        extra: Sequence[str] = (),
+    ) -> bool:
+        """
+        Cheap pre-filter run before a Context is built.
+
+        Returns False only when the content certainly does not start with any
+        prefix. When either prefix is not cached the message is let through
+        so ``get_prefixes`` can resolve it properly.
+        """
+
+        known_guild, guild_prefix = self.peek_guild(guild_id)
+        known_user, user_prefix = self.peek_user(user_id)
+        if not (known_guild and known_user):
+            self.stats["cold"] += 1
+            return True
+
+        prefixes = (guild_prefix or DEFAULT_PREFIX, *extra)
+        if user_prefix:
+            prefixes += (user_prefix,)
+
+        first = content[:1]
+        if first and any(prefix[:1] == first for prefix in prefixes) and content.startswith(prefixes):
+            self.stats["passed"] += 1
+            return True
+
+        self.stats["rejected"] += 1
+        return False
@@ -1,21 +1,355 @@
 import time
 import asyncio
-from collections import defaultdict
+from abc import ABC, abstractmethod
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Optional, Tuple
+from logging import getLogger
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import asyncpg
-from discord.ext.commands import Context, Command
-
-from datetime import datetime, timezone
-from typing import Tuple
 from discord.ext import commands
 from discord.ext.commands import Context, Command
-import asyncpg
+
+logger = getLogger(__name__)
+
+SlotKey = Tuple[int, int, str]
+# (user_id, guild_id, category, usage_count, last_used)
+DirtyRow = Tuple[int, int, str, int, float]
+
+
+def calculate_cooldown(
+    usage_count: int,
+    reputation: int,
+    weight: float,
+    base: float,
+    maximum: float,
+) -> float:
+    reputation_factor = max(0.5, reputation / 100.0)
+    usage_factor = min(2.0, 1.0 + (usage_count / 10.0))
+    cooldown = base * weight * usage_factor / reputation_factor
+    return min(maximum, max(0.5, cooldown))
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for rate limit state.
+
+    ``hit`` must decide and record a command use atomically. The
+    limiter persists whatever ``drain`` returns to ``user_rate_limits``.
+    """
+
+    async def warm(self, records: Iterable[asyncpg.Record]) -> None:
+        pass
+
+    @abstractmethod
+    async def hit(
+        self,
+        key: SlotKey,
+        weight: float,
+        base: float,
+        maximum: float,
+    ) -> Tuple[bool, float, bool]:
+        """Return ``(allowed, retry_after, created)``."""
+
+    @abstractmethod
+    async def seed(self, key: SlotKey, usage_count: int, reputation: int) -> None:
+        ...
+
+    @abstractmethod
+    async def adjust_reputation(self, user_id: int, guild_id: int, adjustment: int) -> None:
+        ...
+
+    @abstractmethod
+    async def set_reputation(self, scores: List[Tuple[SlotKey, int]]) -> None:
+        """Overwrite the reputation of slots that are held, skipping the rest."""
+
+    @abstractmethod
+    async def reset_usage(self, before: float) -> None:
+        ...
+
+    @abstractmethod
+    async def drain(self, skip: Set[SlotKey]) -> List[DirtyRow]:
+        ...
+
+    @abstractmethod
+    def restore(self, rows: List[DirtyRow]) -> None:
+        ...
+
+
+class RateLimitSlot:
+    """Rate limit state for a single (user, guild, category)."""
+
+    __slots__ = ("usage_count", "reputation", "last_used", "dirty")
+
+    def __init__(self, usage_count: int = 0, reputation: int = 100, last_used: float = 0.0):
+        self.usage_count = usage_count
+        self.reputation = reputation
+        # Wall clock seconds, since it is persisted as a timestamp.
+        self.last_used = last_used
+        self.dirty = False
+
+
+class MemoryBackend(RateLimitBackend):
+    """Process-local state. Also serves as the stand-in for tests."""
+
+    def __init__(self, idle_ttl: float = 3600.0):
+        # Slots that have been idle this long are dropped after being flushed.
+        self.idle_ttl = idle_ttl
+        self.slots: Dict[SlotKey, RateLimitSlot] = {}
+
+    async def warm(self, records: Iterable[asyncpg.Record]) -> None:
+        for record in records:
+            key = (record['user_id'], record['guild_id'], record['command_category'])
+            self.slots[key] = RateLimitSlot(
+                record['usage_count'] or 0,
+                record['reputation_score'] if record['reputation_score'] is not None else 100,
+                record['last_used'].timestamp() if record['last_used'] else 0.0,
+            )
+
+    async def hit(
+        self,
+        key: SlotKey,
+        weight: float,
+        base: float,
+        maximum: float,
+    ) -> Tuple[bool, float, bool]:
+        now = time.time()
+        slot = self.slots.get(key)
+        if not slot:
+            slot = self.slots[key] = RateLimitSlot(last_used=now)
+            slot.dirty = True
+            return True, 0.0, True
+
+        cooldown = calculate_cooldown(slot.usage_count, slot.reputation, weight, base, maximum)
+        if slot.last_used:
+            time_since_last = now - slot.last_used
+            if time_since_last < cooldown:
+                return False, cooldown - time_since_last, False
+
+        slot.usage_count += 1
+        slot.last_used = now
+        slot.dirty = True
+        return True, 0.0, False
+
+    async def seed(self, key: SlotKey, usage_count: int, reputation: int) -> None:
+        if slot := self.slots.get(key):
+            slot.usage_count += usage_count
+            slot.reputation = reputation
+
+    async def adjust_reputation(self, user_id: int, guild_id: int, adjustment: int) -> None:
+        for (slot_user, slot_guild, _), slot in self.slots.items():
+            if slot_user == user_id and slot_guild == guild_id:
+                slot.reputation = max(0, min(200, slot.reputation + adjustment))
+
+    async def set_reputation(self, scores: List[Tuple[SlotKey, int]]) -> None:
+        for key, reputation in scores:
+            if slot := self.slots.get(key):
+                slot.reputation = reputation
+
+    async def reset_usage(self, before: float) -> None:
+        for slot in self.slots.values():
+            if slot.last_used < before:
+                slot.usage_count = 0
+
+    async def drain(self, skip: Set[SlotKey]) -> List[DirtyRow]:
+        now = time.time()
+        rows: List[DirtyRow] = []
+        for key, slot in list(self.slots.items()):
+            if key in skip:
+                continue
+
+            if slot.dirty:
+                rows.append((*key, slot.usage_count, slot.last_used))
+                slot.dirty = False
+            elif now - slot.last_used > self.idle_ttl:
+                del self.slots[key]
+
+        return rows
+
+    def restore(self, rows: List[DirtyRow]) -> None:
+        for user_id, guild_id, category, *_ in rows:
+            if slot := self.slots.get((user_id, guild_id, category)):
+                slot.dirty = True
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    State shared between processes through Redis.
+
+    Each (user, guild, category) is a hash updated by a Lua script, so the
+    read-decide-write in ``hit`` is atomic across every shard process.
+    Keys expire after ``ttl`` seconds of inactivity, which doubles as the
+    daily usage reset. A set per (user, guild) lists that user's hashes so
+    reputation changes do not have to scan the keyspace.
+
+    While Redis is unreachable, ``hit`` falls back to a process-local
+    MemoryBackend rather than failing command dispatch.
+    """
+
+    HIT = """
+    local now = tonumber(ARGV[1])
+    local weight = tonumber(ARGV[2])
+    local base = tonumber(ARGV[3])
+    local maximum = tonumber(ARGV[4])
+    local ttl = tonumber(ARGV[5])
+
+    local state = redis.call('HMGET', KEYS[1], 'usage', 'reputation', 'last')
+    if not state[3] then
+        redis.call('HSET', KEYS[1], 'usage', 0, 'reputation', 100, 'last', ARGV[1])
+        redis.call('PEXPIRE', KEYS[1], ttl)
+        redis.call('SADD', KEYS[2], KEYS[1])
+        redis.call('PEXPIRE', KEYS[2], ttl)
+        return {1, '0', 1}
+    end
+
+    local usage = tonumber(state[1]) or 0
+    local reputation = tonumber(state[2]) or 100
+    local reputation_factor = math.max(0.5, reputation / 100.0)
+    local usage_factor = math.min(2.0, 1.0 + (usage / 10.0))
+    local cooldown = math.min(maximum, math.max(0.5, base * weight * usage_factor / reputation_factor))
+
+    local elapsed = now - tonumber(state[3])
+    if elapsed < cooldown then
+        return {0, tostring(cooldown - elapsed), 0}
+    end
+
+    redis.call('HINCRBY', KEYS[1], 'usage', 1)
+    redis.call('HSET', KEYS[1], 'last', ARGV[1])
+    redis.call('PEXPIRE', KEYS[1], ttl)
+    redis.call('PEXPIRE', KEYS[2], ttl)
+    return {1, '0', 0}
+    """
+
+    ADJUST = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return 0
+    end
+    local reputation = tonumber(redis.call('HGET', KEYS[1], 'reputation')) or 100
+    reputation = math.max(0, math.min(200, reputation + tonumber(ARGV[1])))
+    redis.call('HSET', KEYS[1], 'reputation', reputation)
+    return reputation
+    """
+
+    SET_REPUTATION = """
+    for i, key in ipairs(KEYS) do
+        if redis.call('EXISTS', key) == 1 then
+            redis.call('HSET', key, 'reputation', ARGV[i])
+        end
+    end
+    return 0
+    """
+
+    def __init__(self, redis, ttl: float = 86400.0, prefix: str = "ratelimit"):
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+        self.fallback = MemoryBackend()
+        self.available = True
+        # Keys this process has written since the last flush.
+        self._dirty: Set[SlotKey] = set()
+        self._hit = redis.register_script(self.HIT)
+        self._adjust = redis.register_script(self.ADJUST)
+        self._set_reputation = redis.register_script(self.SET_REPUTATION)
+
+    def _key(self, key: SlotKey) -> str:
+        user_id, guild_id, category = key
+        return f"{self.prefix}:{user_id}:{guild_id}:{category}"
+
+    def _user_key(self, user_id: int, guild_id: int) -> str:
+        return f"{self.prefix}:keys:{user_id}:{guild_id}"
+
+    async def hit(
+        self,
+        key: SlotKey,
+        weight: float,
+        base: float,
+        maximum: float,
+    ) -> Tuple[bool, float, bool]:
+        try:
+            allowed, retry_after, created = await self._hit(
+                keys=[self._key(key), self._user_key(key[0], key[1])],
+                args=[repr(time.time()), weight, base, maximum, int(self.ttl * 1000)],
+            )
+        except Exception as exc:
+            if self.available:
+                self.available = False
+                logger.warning(f"Redis rate limit store is unavailable, using local state: {exc}")
+            return await self.fallback.hit(key, weight, base, maximum)
+
+        if not self.available:
+            self.available = True
+            logger.info("Redis rate limit store is available again")
+        if allowed:
+            self._dirty.add(key)
+        return bool(allowed), float(retry_after), bool(created)
+
+    async def seed(self, key: SlotKey, usage_count: int, reputation: int) -> None:
+        await self.fallback.seed(key, usage_count, reputation)
+        name = self._key(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(name, "usage", usage_count)
+            pipe.hset(name, "reputation", reputation)
+            await pipe.execute()
+        self._dirty.add(key)
+
+    async def adjust_reputation(self, user_id: int, guild_id: int, adjustment: int) -> None:
+        await self.fallback.adjust_reputation(user_id, guild_id, adjustment)
+        for name in await self.redis.smembers(self._user_key(user_id, guild_id)):
+            await self._adjust(keys=[name], args=[adjustment])
+
+    async def set_reputation(self, scores: List[Tuple[SlotKey, int]]) -> None:
+        await self.fallback.set_reputation(scores)
+        if scores:
+            await self._set_reputation(
+                keys=[self._key(key) for key, _ in scores],
+                args=[reputation for _, reputation in scores],
+            )
+
+    async def reset_usage(self, before: float) -> None:
+        # Idle keys expire on their own after ``ttl``.
+        await self.fallback.reset_usage(before)
+
+    async def drain(self, skip: Set[SlotKey]) -> List[DirtyRow]:
+        rows = await self.fallback.drain(skip)
+        keys = [key for key in self._dirty if key not in skip]
+        if not keys:
+            return rows
+
+        self._dirty.difference_update(keys)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hmget(self._key(key), "usage", "last")
+                states = await pipe.execute()
+        except Exception:
+            self._dirty.update(keys)
+            self.fallback.restore(rows)
+            raise
+
+        return rows + [
+            (*key, int(usage), float(last))
+            for key, (usage, last) in zip(keys, states)
+            if usage is not None and last is not None
+        ]
+
+    def restore(self, rows: List[DirtyRow]) -> None:
+        self.fallback.restore(rows)
+        self._dirty.update((user_id, guild_id, category) for user_id, guild_id, category, *_ in rows)
 
 
 class DynamicRateLimiter:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        backend: Optional[RateLimitBackend] = None,
+        flush_interval: float = 15.0,
+        *,
+        retention: timedelta = timedelta(days=30),
+        reputation_decay: int = 5,
+        maintenance_interval: float = 86400.0,
+        maintenance_delay: float = 60.0,
+        chunk_size: int = 5000,
+    ):
         self.pool = pool
+        self.backend = backend or MemoryBackend()
         self.command_weights = {
             'moderation': 1.0,
             'configuration': 2.5,
@@ -30,6 +364,20 @@ class DynamicRateLimiter:
         self.base_cooldown = 1.0
         self.max_cooldown = 30.0
         self.reputation_threshold = 50
+        self.flush_interval = flush_interval
+        # Keys whose stored row is still being loaded; not flushed until done.
+        self._hydrating: Set[SlotKey] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Rows idle longer than this are deleted by ``maintenance``.
+        self.retention = retention
+        # Points per run that reputation drifts back towards 100.
+        self.reputation_decay = reputation_decay
+        self.maintenance_interval = maintenance_interval
+        # The first run happens this soon after start, so restarts cannot
+        # keep pushing it back.
+        self.maintenance_delay = maintenance_delay
+        self.chunk_size = chunk_size
+        self._maintenance_task: Optional[asyncio.Task] = None
 
     def _get_command_category(self, command: Command) -> str:
         if command.cog:
@@ -37,10 +385,7 @@ class DynamicRateLimiter:
         return 'default'
 
     def _calculate_cooldown(self, usage_count: int, reputation: int, weight: float) -> float:
-        reputation_factor = max(0.5, reputation / 100.0)
-        usage_factor = min(2.0, 1.0 + (usage_count / 10.0))
-        cooldown = self.base_cooldown * weight * usage_factor / reputation_factor
-        return min(self.max_cooldown, max(0.5, cooldown))
+        return calculate_cooldown(usage_count, reputation, weight, self.base_cooldown, self.max_cooldown)
 
     def _is_excluded(self, command: Command) -> bool:
         if command is None:
@@ -80,59 +425,208 @@ class DynamicRateLimiter:
         category = self._get_command_category(ctx.command)
         weight = self.command_weights.get(category, self.command_weights['default'])
 
+        key = (ctx.author.id, ctx.guild.id, category)
+        allowed, retry_after, created = await self.backend.hit(
+            key, weight, self.base_cooldown, self.max_cooldown
+        )
+        if created:
+            # The first use is always allowed, matching a missing row. The
+            # stored row, if any, is pulled in without holding up dispatch.
+            self._hydrating.add(key)
+            asyncio.create_task(self._hydrate(key))
+
+        return allowed, retry_after
+
+    async def _hydrate(self, key: SlotKey):
         query = """
-        SELECT usage_count, reputation_score, last_used
+        SELECT usage_count, reputation_score
         FROM user_rate_limits
         WHERE user_id = $1 AND guild_id = $2 AND command_category = $3
         """
-        record = await self.pool.fetchrow(query, ctx.author.id, ctx.guild.id, category)
+        try:
+            record = await self.pool.fetchrow(query, *key)
+            if record:
+                await self.backend.seed(
+                    key,
+                    record['usage_count'] or 0,
+                    record['reputation_score'] if record['reputation_score'] is not None else 100,
+                )
+        except Exception as exc:
+            logger.warning(f"Failed to load rate limit state for {key}: {exc}")
+        finally:
+            self._hydrating.discard(key)
 
-        if not record:
-            await self._create_rate_limit_record(ctx.author.id, ctx.guild.id, category)
-            return True, 0.0
+    async def start(self):
+        """Warm recently active state and start the periodic flush."""
 
-        usage_count = record['usage_count']
-        reputation = record['reputation_score']
-        last_used = record['last_used']
+        query = """
+        SELECT user_id, guild_id, command_category, usage_count, reputation_score, last_used
+        FROM user_rate_limits
+        WHERE last_used > NOW() - INTERVAL '1 hour'
+        """
+        await self.backend.warm(await self.pool.fetch(query))
 
-        cooldown = self._calculate_cooldown(usage_count, reputation, weight)
+        if not self._flush_task:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        if not self._maintenance_task:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
 
-        if last_used:
-            time_since_last = (datetime.now(timezone.utc) - last_used).total_seconds()
-            if time_since_last < cooldown:
-                return False, cooldown - time_since_last
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        await self.flush()
 
-        await self._update_usage(ctx.author.id, ctx.guild.id, category, usage_count + 1)
-        return True, 0.0
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error("Failed to flush rate limit state", exc_info=exc)
 
-    async def _create_rate_limit_record(self, user_id: int, guild_id: int, category: str):
-        query = """
-        INSERT INTO user_rate_limits (user_id, guild_id, command_category)
-        VALUES ($1, $2, $3)
-        ON CONFLICT (user_id, guild_id, command_category) DO NOTHING
-        """
-        await self.pool.execute(query, user_id, guild_id, category)
+    async def flush(self) -> int:
+        """Write changed state to user_rate_limits in one batch."""
+
+        rows = await self.backend.drain(self._hydrating)
+        if not rows:
+            return 0
 
-    async def _update_usage(self, user_id: int, guild_id: int, category: str, new_count: int):
         query = """
-        UPDATE user_rate_limits
-        SET usage_count = $4, last_used = NOW()
-        WHERE user_id = $1 AND guild_id = $2 AND command_category = $3
+        INSERT INTO user_rate_limits (user_id, guild_id, command_category, usage_count, last_used)
+        VALUES ($1, $2, $3, $4, $5)
+        ON CONFLICT (user_id, guild_id, command_category)
+        DO UPDATE SET usage_count = EXCLUDED.usage_count, last_used = EXCLUDED.last_used
         """
-        await self.pool.execute(query, user_id, guild_id, category, new_count)
+        try:
+            await self.pool.executemany(query, [
+                (user_id, guild_id, category, usage_count, datetime.fromtimestamp(last_used, timezone.utc))
+                for user_id, guild_id, category, usage_count, last_used in rows
+            ])
+        except Exception:
+            self.backend.restore(rows)
+            raise
+
+        return len(rows)
 
     async def adjust_reputation(self, user_id: int, guild_id: int, adjustment: int):
         query = """
         UPDATE user_rate_limits
-        SET reputation_score = GREATEST(0, LEAST(200, reputation_score + $4))
+        SET reputation_score = GREATEST(0, LEAST(200, reputation_score + $3))
         WHERE user_id = $1 AND guild_id = $2
         """
         await self.pool.execute(query, user_id, guild_id, adjustment)
+        await self.backend.adjust_reputation(user_id, guild_id, adjustment)
+
+    async def _run_chunked(self, query: str, *args) -> int:
+        """Run a statement limited to ``chunk_size`` rows until it touches none."""
+
+        total = 0
+        while True:
+            status = await self.pool.execute(query, self.chunk_size, *args)
+            touched = int(status.split()[-1])
+            total += touched
+            if touched < self.chunk_size:
+                return total
+            await asyncio.sleep(0)
+
+    async def reset_daily_limits(self) -> int:
+        await self.flush()
+        await self.backend.reset_usage(time.time() - 86400)
 
-    async def reset_daily_limits(self):
         query = """
         UPDATE user_rate_limits
         SET usage_count = 0
-        WHERE last_used < NOW() - INTERVAL '24 hours'
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM user_rate_limits
+            WHERE usage_count <> 0 AND last_used < NOW() - INTERVAL '24 hours'
+            LIMIT $1
+        ))
+        """
+        return await self._run_chunked(query)
+
+    async def prune(self) -> int:
+        """
+        Delete rows idle past the retention horizon, along with the
+        notification pseudo-categories that are now throttled in memory.
         """
-        await self.pool.execute(query)
+
+        query = """
+        DELETE FROM user_rate_limits
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM user_rate_limits
+            WHERE last_used < NOW() - $2::INTERVAL
+            OR command_category IN ('prefix_mention', 'blacklist_notification', 'error_handling')
+            LIMIT $1
+        ))
+        """
+        return await self._run_chunked(query, self.retention)
+
+    async def decay_reputation(self) -> int:
+        """
+        Move every reputation score ``reputation_decay`` points towards 100,
+        in Postgres and in whatever slots the backend currently holds.
+        """
+
+        # Rows stay eligible after a single step, so walk the primary key
+        # instead of re-selecting by predicate.
+        query = """
+        WITH batch AS (
+            SELECT user_id, guild_id, command_category
+            FROM user_rate_limits
+            WHERE reputation_score <> 100
+            AND (user_id, guild_id, command_category) > ($3, $4, $5)
+            ORDER BY user_id, guild_id, command_category
+            LIMIT $1
+        )
+        UPDATE user_rate_limits AS limits
+        SET reputation_score = CASE
+            WHEN limits.reputation_score > 100 THEN GREATEST(100, limits.reputation_score - $2)
+            ELSE LEAST(100, limits.reputation_score + $2)
+        END
+        FROM batch
+        WHERE limits.user_id = batch.user_id
+        AND limits.guild_id = batch.guild_id
+        AND limits.command_category = batch.command_category
+        RETURNING limits.user_id, limits.guild_id, limits.command_category, limits.reputation_score
+        """
+        total = 0
+        cursor = (0, 0, "")
+        while True:
+            records = await self.pool.fetch(query, self.chunk_size, self.reputation_decay, *cursor)
+            total += len(records)
+            scores = [
+                ((record['user_id'], record['guild_id'], record['command_category']), record['reputation_score'])
+                for record in records
+            ]
+            await self.backend.set_reputation(scores)
+            if len(records) < self.chunk_size:
+                return total
+            cursor = max(key for key, _ in scores)
+            await asyncio.sleep(0)
+
+    async def maintenance(self) -> dict[str, float]:
+        started = time.perf_counter()
+        report = {
+            "reset": await self.reset_daily_limits(),
+            "pruned": await self.prune(),
+            "decayed": await self.decay_reputation() if self.reputation_decay else 0,
+        }
+        report["elapsed"] = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"Rate limit maintenance reset {report['reset']}, pruned {report['pruned']}"
+            f" and decayed {report['decayed']} rows in {report['elapsed']}s"
+        )
+        return report
+
+    async def _maintenance_loop(self):
+        await asyncio.sleep(self.maintenance_delay)
+        while True:
+            try:
+                await self.maintenance()
+            except Exception as exc:
+                logger.error("Rate limit maintenance failed", exc_info=exc)
+            await asyncio.sleep(self.maintenance_interval)
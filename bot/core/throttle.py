@@ -0,0 +1,54 @@
+import heapq
+from time import monotonic
+from typing import Hashable
+
+
+class Throttle:
+    """
+    TTL-keyed suppression of repeated actions, such as notifications.
+
+    ``allow`` returns True at most once per key within its TTL. Expired
+    entries are evicted as new ones arrive, and the store never holds
+    more than ``maxsize`` keys.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self.entries: dict[Hashable, float] = {}
+        self._expiry: list[tuple[float, int, Hashable]] = []
+        self._counter = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        expires = self.entries.get(key)
+        return expires is not None and expires > monotonic()
+
+    def _evict(self, now: float) -> None:
+        while self._expiry and (
+            self._expiry[0][0] <= now or len(self.entries) > self.maxsize
+        ):
+            expires, _, key = heapq.heappop(self._expiry)
+            # Skip heap entries superseded by a later ``allow``.
+            if self.entries.get(key) == expires:
+                del self.entries[key]
+                self.evictions += 1
+
+    def allow(self, key: Hashable, ttl: float) -> bool:
+        now = monotonic()
+        self._evict(now)
+
+        expires = self.entries.get(key)
+        if expires is not None and expires > now:
+            return False
+
+        expires = now + ttl
+        self.entries[key] = expires
+        self._counter += 1
+        heapq.heappush(self._expiry, (expires, self._counter, key))
+        return True
+
+    def reset(self, key: Hashable) -> None:
+        self.entries.pop(key, None)
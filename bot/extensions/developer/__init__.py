@@ -81,10 +81,12 @@ class Developer(Cog, command_attrs=dict(hidden=False)):
         query = "DELETE FROM blacklist WHERE target_id = $1"
         status = await self.bot.pool.execute(query, target_id)
         if status == "DELETE 1":
+            await self.bot.blacklist.remove(target_id)
             return await ctx.approve(f"Now allowing `{target_id}` to use the bot")
 
         query = "INSERT INTO blacklist (target_id, reason) VALUES ($1, $2)"
         await self.bot.pool.execute(query, target_id, reason)
+        await self.bot.blacklist.add(target_id)
         async with ctx.typing():
             if isinstance(target, User):
                 for guild in target.mutual_guilds:
@@ -150,9 +152,23 @@ class Developer(Cog, command_attrs=dict(hidden=False)):
             if not prefix:
                 query = "INSERT INTO config (guild_id, prefix) VALUES($1, $2)"
                 await self.bot.pool.execute(query, guild.id, "!")
+                self.bot.prefixes.set_guild(guild.id, "!")
                 print(f"Default prefix set for {guild.name}")
         await ctx.approve("Prefixes updated for all servers!")
 
+    @command(name="greetings")
+    async def greeting_status(self, ctx: Context):
+        """View the welcome, goodbye and boost queue."""
+        welcome = self.bot.get_cog("Welcome")
+        if not welcome:
+            return await ctx.warn("**The triggers extension is not loaded**")
+
+        stats = welcome.greetings.stats()
+        embed = Embed(color=0xacacac, title="Greeting Queue")
+        for name, value in stats.items():
+            embed.add_field(name=name.title(), value=f"{value:,}", inline=True)
+        await ctx.send(embed=embed)
+
     @command(name="ratelimit")
     async def rate_limit_status(self, ctx: Context, user: Optional[User] = None):
         """View rate limit status for a user."""
@@ -160,6 +176,9 @@ class Developer(Cog, command_attrs=dict(hidden=False)):
         
         if not ctx.guild:
             return await ctx.warn("**This command can only be used in servers**")
+
+        if hasattr(ctx.bot, 'rate_limiter'):
+            await ctx.bot.rate_limiter.flush()
         
         query = """
         SELECT command_category, usage_count, reputation_score, last_used
@@ -4,189 +4,38 @@ from bot.core import Bot
 import aiohttp, discord
 from io import BytesIO
 from cashews import cache
-from datetime import datetime, timezone, timedelta
-from babel.dates import format_date
 from discord.utils import format_dt
-import humanize, asyncio, asyncpg
+import asyncio, asyncpg
 import re , shlex
 from discord.ext.commands import has_permissions, CheckFailure, cooldown, CooldownMapping, BucketType, CommandOnCooldown
 from ...shared.paginator import Paginator
 from bot.shared.fakeperms import hybrid_permissions
 import uuid
 import json
+from types import SimpleNamespace
+from collections import OrderedDict
+from typing import Optional
+from logging import getLogger
 
+from .script import ScriptError, compile_script, parse_script
+from .template import compile_template
+from .variables import resolve_deferred
 
-def get_vars_map(ctx: Context) -> dict:
-    guild = ctx.guild
-    member = ctx.author
-    channel = ctx.channel
-
-    pst = timezone(timedelta(hours=-8))
-    now_utc = datetime.now(timezone.utc)
-    now_pst = now_utc.astimezone(pst)
-
-    try:
-        sorted_members = sorted(guild.members, key=lambda m: m.joined_at or datetime.utcnow())
-        join_position = sorted_members.index(member) + 1
-        join_position_suffix = f"{join_position}th"
-    except ValueError:
-        join_position = "N/A"
-        join_position_suffix = "N/A"
-
-    return {
-        # Guild vars
-        "guild.name": guild.name,
-        "guild.id": guild.id,
-        "guild.member_count": guild.member_count,
-        "guild.region": getattr(guild, "region", "N/A"),
-        "guild.shard": guild.shard_id,
-        "guild.owner_id": guild.owner_id,
-        "guild.created_at": format_date(guild.created_at, format="long", locale="en"),
-        "guild.created_at_timestamp": f"<t:{int(guild.created_at.timestamp())}:R>",
-        "guild.created_at_humanized": humanize.naturaltime(datetime.now(timezone.utc) - guild.created_at),
-        "guild.emoji_count": len(guild.emojis),
-        "guild.role_count": len(guild.roles),
-        "guild.boost_count": guild.premium_subscription_count,
-        "guild.boost_tier": getattr(guild, "premium_tier", "No Level"),
-        "guild.preferred_locale": guild.preferred_locale,
-        "guild.key_features": guild.features,
-        "guild.icon": guild.icon.url if guild.icon else "N/A",
-        "guild.banner": guild.banner.url if guild.banner else "N/A",
-        "guild.splash": guild.splash.url if guild.splash else "N/A",
-        "guild.discovery": guild.discovery_splash.url if guild.discovery_splash else "N/A",
-        "guild.max_presences": guild.max_presences,
-        "guild.max_members": guild.max_members,
-        "guild.max_video_channel_users": guild.max_video_channel_users,
-        "guild.afk_timeout": guild.afk_timeout,
-        "guild.afk_channel": guild.afk_channel.name if guild.afk_channel else "N/A",
-        "guild.channels_count": len(guild.channels),
-        "guild.text_channels_count": len(guild.text_channels),
-        "guild.voice_channels_count": len(guild.voice_channels),
-        "guild.category_channels_count": len(guild.categories),
-
-        # User vars
-        "user": str(member),
-        "user.id": member.id,
-        "user.mention": member.mention,
-        "user.name": member.name,
-        "user.tag": f"{member.discriminator:0>4}",
-        "user.avatar": member.avatar.url if member.avatar else "N/A",
-        "user.guild_avatar": member.guild_avatar.url if member.guild_avatar else "N/A",
-        "user.display_avatar": member.display_avatar.url,
-        "user.joined_at": format_date(member.joined_at, format="long", locale="en") if member.joined_at else "N/A",
-        "user.joined_at_timestamp": f"<t:{int(member.joined_at.timestamp())}:R>" if member.joined_at else "N/A",
-        "user.created_at": format_date(member.created_at, format="long", locale="en"),
-        "user.created_at_timestamp": f"<t:{int(member.created_at.timestamp())}:R>",
-        "user.display_name": member.display_name,
-        "user.boost": "Yes" if member.premium_since else "No",
-        "user.boost_since": format_date(member.premium_since, format="long", locale="en") if member.premium_since else "N/A",
-        "user.boost_since_timestamp": f"<t:{int(member.premium_since.timestamp())}:R>" if member.premium_since else "N/A",
-        "user.color": str(member.top_role.color) if member.top_role else "N/A",
-        "user.top_role": member.top_role.name if member.top_role else "N/A",
-        "user.role_list": ", ".join(role.name for role in member.roles if role.name != "@everyone"),
-        "user.role_text_list": ", ".join([r.name for r in member.roles if r.name != "@everyone"]),
-        "user.bot": "Yes" if member.bot else "No",
-        "user.badges_icons": "N/A",
-        "user.badges": "N/A",
-        "user.join_position": join_position,
-        "user.join_position_suffix": join_position_suffix,
-
-        # Channel vars
-        "channel.name": channel.name,
-        "channel.id": channel.id,
-        "channel.mention": channel.mention,
-        "channel.topic": getattr(channel, "topic", "N/A"),
-        "channel.type": str(channel.type),
-        "channel.category_id": channel.category_id if channel.category_id else "N/A",
-        "channel.category_name": channel.category.name if channel.category else "N/A",
-        "channel.position": channel.position,
-        "channel.slowmode_delay": getattr(channel, "slowmode_delay", 0),
-
-        # Date and time vars
-        "date.now": now_pst.strftime("%B %d, %Y"),
-        "date.utc_timestamp": int(now_utc.timestamp()),
-        "date.now_proper": now_pst.strftime("%A, %B %d, %Y"),
-        "date.now_short": now_pst.strftime("%b %d, %Y"),
-        "date.now_shorter": now_pst.strftime("%m/%d/%y"),
-        "time.now": now_pst.strftime("%I:%M %p"),
-        "time.now_military": now_pst.strftime("%H:%M"),
-        "date.utc_now": now_utc.strftime("%B %d, %Y"),
-        "date.utc_now_proper": now_utc.strftime("%A, %B %d, %Y"),
-        "date.utc_now_short": now_utc.strftime("%b %d, %Y"),
-        "date.utc_now_shorter": now_utc.strftime("%m/%d/%y"),
-        "time.utc_now": now_utc.strftime("%I:%M %p"),
-        "time.utc_now_military": now_utc.strftime("%H:%M"),
-    }
+logger = getLogger(__name__)
 
-def replace_vars(text: str, ctx: Context, extra: dict = None) -> str:
-    vars_map = get_vars_map(ctx)
-    if extra:
-        vars_map.update(extra)
-
-    for k, v in vars_map.items():
-        text = text.replace(f"{{{k}}}", str(v))
 
-    mention_pattern = re.compile(r"<@([a-zA-Z0-9_]+)>")
+def replace_vars(text: str, ctx: Context, extra: dict = None) -> str:
+    return compile_template(text).render(ctx, extra)
 
-    def resolve_user(match):
-        name = match.group(1)
-        user = discord.utils.find(lambda m: m.name == name, ctx.guild.members)
-        return user.mention if user else match.group(0)
+async def render_vars(text: str, ctx: Context, extra: dict = None) -> str:
+    """``replace_vars`` for async callers, with awaited variables such as ``level.rank`` resolved."""
 
-    return mention_pattern.sub(resolve_user, text)
+    template = compile_template(text)
+    return template.render(ctx, await resolve_deferred(ctx, template.variables, extra))
 
 async def build_embed_from_raw(bot: Bot, ctx: Context, raw: str, extra: dict = None) -> tuple[str, discord.Embed]:
-    parts = raw.split("$v")
-    data = {}
-    message_content = ""
-
-    for part in parts:
-        match = re.match(r"\{([^:]+):(.+?)\}$", part.strip(), re.DOTALL)
-        if match:
-            key = match.group(1).strip().lower()
-            value = match.group(2).strip()
-            if key == "message":
-                message_content = replace_vars(value, ctx, extra=extra)
-            else:
-                data[key] = value
-
-    embed = discord.Embed()
-
-    if "title" in data:
-        embed.title = replace_vars(data["title"], ctx, extra=extra)
-    if "description" in data:
-        embed.description = replace_vars(data["description"], ctx, extra=extra)
-    if "color" in data:
-        try:
-            embed.color = discord.Color(int(data["color"].lstrip("#"), 16))
-        except ValueError:
-            embed.color = discord.Color.default()
-    if "footer" in data:
-        if ";" in data["footer"]:
-            footer_parts = dict(item.strip().split("=") for item in data["footer"].split(";") if "=" in item)
-            embed.set_footer(
-                text=replace_vars(footer_parts.get("text", ""), ctx, extra=extra),
-                icon_url=footer_parts.get("icon")
-            )
-        else:
-            embed.set_footer(text=replace_vars(data["footer"], ctx, extra=extra))
-    if "author" in data:
-        if ";" in data["author"]:
-            author_parts = dict(item.strip().split("=") for item in data["author"].split(";") if "=" in item)
-            embed.set_author(
-                name=replace_vars(author_parts.get("name", ""), ctx, extra=extra),
-                icon_url=author_parts.get("icon")
-            )
-        else:
-            embed.set_author(name=replace_vars(data["author"], ctx, extra=extra))
-    if "thumbnail" in data:
-        embed.set_thumbnail(url=data["thumbnail"])
-    if "image" in data:
-        embed.set_image(url=data["image"])
-    if "timestamp" in data and data["timestamp"].lower() == "now":
-        embed.timestamp = discord.utils.utcnow()
-
-    return message_content, embed
+    script = compile_script(raw)
+    return script.render(ctx, await resolve_deferred(ctx, script.variables, extra))
 
 
 class Embeds(Cog):
@@ -219,112 +68,232 @@ class Embeds(Cog):
         raw = re.sub(r"<#\d+>", "", raw).strip()
 
         if "{embed}" not in raw:
-            final = replace_vars(raw, ctx).replace("\\n", "\n")
+            final = (await render_vars(raw, ctx)).replace("\\n", "\n")
             return await ctx.send(final)
 
-        parts = raw.split("$v")
-        data = {}
-        message_content = ""
-
-        for part in parts:
-            stripped = part.strip()
-            if not stripped or stripped.lower() == "{embed}":
-                continue
+        try:
+            script = parse_script(raw, strict=True)
+        except ScriptError as e:
+            return await ctx.warn(str(e))
 
-            # message: block handling (with or without curly braces)
-            if stripped.startswith("{message:") and stripped.endswith("}"):
-                message_content = replace_vars(stripped[9:-1].strip(), ctx).replace("\\n", "\n")
-                continue
-            if stripped.lower().startswith("message:"):
-                message_content = replace_vars(stripped[8:].strip(), ctx).replace("\\n", "\n")
-                continue
+        try:
+            message_content, embed = script.render(ctx)
+            await ctx.send(content=message_content.replace("\\n", "\n") or None, embed=embed)
+        except Exception as e:
+            await ctx.warn(f"Embed error: {e}")
 
-            if not stripped.startswith("{") or not stripped.endswith("}"):
-                return await ctx.warn(f"Missing opening or closing bracket: `{stripped}`")
 
-            content = stripped[1:-1].strip()
-            if ":" not in content:
-                return await ctx.warn(f"Missing colon (`:`) in block: `{stripped}`")
+def button_view(records) -> ui.View:
+    view = ui.View(timeout=None)
+    for r in records:
+        view.add_item(ui.Button(
+            label=r["label"],
+            style=ButtonStyle(r["style"]),
+            emoji=r["emoji"],
+            custom_id=r["custom_id"]
+        ))
+    # Stopped views are not stored when sent; Persistent.on_interaction
+    # answers the clicks instead.
+    view.stop()
+    return view
+
+
+class ButtonResponse:
+    """
+    A persistent button's reply, compiled when the button is indexed.
+
+    Plain text is sent as is. An embed script that references no
+    variables is rendered once up front, and any other script keeps its
+    compiled slots and fills them in on each click.
+    """
+
+    __slots__ = ("text", "script", "prebuilt")
+
+    def __init__(self, raw: str):
+        self.text = None
+        self.script = None
+        self.prebuilt = None
+        if not raw.strip().startswith("{embed}"):
+            self.text = raw
+            return
+
+        self.script = parse_script(raw)
+        if self.script.static:
+            self.prebuilt = self.script.render(None)
+
+    def render(self, interaction: Interaction) -> tuple[str, Embed]:
+        if self.prebuilt:
+            return self.prebuilt
+
+        ctx_like = SimpleNamespace(
+            bot=interaction.client,
+            guild=interaction.guild,
+            author=interaction.user,
+            channel=interaction.channel
+        )
+        return self.script.render(ctx_like)
 
-            key, value = content.split(":", 1)
-            key = key.strip().lower()
-            value = value.strip()
 
-            if key.startswith("field"):
-                count = sum(1 for k in data if k.startswith("field"))
-                data[f"field{count + 1}"] = value
-            else:
-                if key in data:
-                    return await ctx.warn(f"Duplicate key `{key}` detected.")
-                data[key] = value
+class Persistent(Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        # custom_id -> compiled response, answered by on_interaction. Discord
+        # keeps the buttons on the message, so nothing has to be re-attached.
+        self.responses: dict[str, ButtonResponse] = {}
+        # message_id -> (guild_id, channel_id) for every message with buttons.
+        self.button_messages: dict[int, tuple[int, int]] = {}
+        # message_id -> channel_id for the bot's recent messages, so button
+        # add can find a message from a bare ID without scanning channels.
+        self.message_channels: OrderedDict[int, int] = OrderedDict()
+        self.message_channels_size = 50_000
+
+    async def cog_load(self):
+        rows = await self.bot.pool.fetch(
+            "SELECT guild_id, channel_id, message_id, custom_id, response FROM persistent_buttons"
+        )
+        self.responses = {r["custom_id"]: ButtonResponse(r["response"]) for r in rows}
+        self.button_messages = {r["message_id"]: (r["guild_id"], r["channel_id"]) for r in rows}
+        asyncio.create_task(self.reconcile())
+
+    async def reconcile(self) -> None:
+        """Catch up on guilds and channels lost while offline, using the caches only."""
+
+        # Guild caches are only complete once the bot is ready.
+        await self.bot.wait_until_ready()
+        orphans = [
+            message_id for message_id, (guild_id, channel_id) in list(self.button_messages.items())
+            if self._orphaned(guild_id, channel_id)
+        ]
+        if orphans:
+            removed = await self.purge(orphans)
+            logger.info(f"Removed {removed} orphaned persistent buttons")
+
+    def _owns(self, guild_id: int) -> bool:
+        """Whether this process runs the shard ``guild_id`` lives on."""
+
+        shard_ids, shard_count = self.bot.shard_ids, self.bot.shard_count
+        if shard_ids is None or not shard_count:
+            return True
+        return (guild_id >> 22) % shard_count in shard_ids
+
+    def _orphaned(self, guild_id: int, channel_id: int) -> bool:
+        guild = self.bot.get_guild(guild_id)
+        if not guild:
+            # Other processes' guilds are never in this cache.
+            return self._owns(guild_id)
+        if guild.unavailable:
+            return False
+        return guild.get_channel_or_thread(channel_id) is None
+
+    async def purge(self, message_ids) -> int:
+        """Delete every button on ``message_ids`` in one statement."""
+
+        message_ids = list(message_ids)
+        rows = await self.bot.pool.fetch(
+            "DELETE FROM persistent_buttons WHERE message_id = ANY($1::bigint[]) RETURNING custom_id",
+            message_ids
+        )
+        for r in rows:
+            self.responses.pop(r["custom_id"], None)
+        for message_id in message_ids:
+            self.button_messages.pop(message_id, None)
+        return len(rows)
+
+    @Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        if orphans := [m for m, (g, _) in self.button_messages.items() if g == guild.id]:
+            await self.purge(orphans)
+
+    @Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        if orphans := [m for m, (_, c) in self.button_messages.items() if c == channel.id]:
+            await self.purge(orphans)
+
+    @Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        if payload.message_id in self.button_messages:
+            await self.purge([payload.message_id])
+
+    @Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        if orphans := payload.message_ids & self.button_messages.keys():
+            await self.purge(orphans)
+
+    @Cog.listener()
+    async def on_interaction(self, interaction: Interaction):
+        if interaction.type is not discord.InteractionType.component:
+            return
+
+        custom_id = (interaction.data or {}).get("custom_id")
+        response = self.responses.get(custom_id)
+        if response is None:
+            return
+
+        if response.text is not None:
+            return await interaction.response.send_message(response.text, ephemeral=True)
 
         try:
-            embed = Embed()
-            allowed_keys = {
-                "title", "description", "color", "footer", "author",
-                "thumbnail", "image", "timestamp"
-            }
+            content, embed = response.render(interaction)
+        except Exception as e:
+            return await interaction.response.send_message(f"Failed to build embed: {e}", ephemeral=True)
+        await interaction.response.send_message(content=content or None, embed=embed, ephemeral=True)
 
-            for k in data:
-                if not k.startswith("field") and k not in allowed_keys:
-                    return await ctx.warn(f"Unknown embed key: `{k}`")
+    @Cog.listener()
+    async def on_message(self, message: Message):
+        if not message.guild or message.author.id != self.bot.user.id:
+            return
 
-            if "title" in data:
-                embed.title = replace_vars(data["title"], ctx)
-            if "description" in data:
-                embed.description = replace_vars(data["description"], ctx)
-            if "color" in data:
-                try:
-                    embed.color = discord.Color(int(data["color"].lstrip("#"), 16))
-                except ValueError:
-                    return await ctx.warn(f"Invalid hex color: `{data['color']}`")
-            if "footer" in data:
-                if ";" in data["footer"]:
-                    try:
-                        footer_parts = dict(item.strip().split("=") for item in data["footer"].split(";") if "=" in item)
-                        embed.set_footer(text=replace_vars(footer_parts.get("text", ""), ctx), icon_url=footer_parts.get("icon"))
-                    except Exception:
-                        return await ctx.warn("Invalid footer format. Use `text=...; icon=...`")
-                else:
-                    embed.set_footer(text=replace_vars(data["footer"], ctx))
-            if "author" in data:
-                if ";" in data["author"]:
-                    try:
-                        author_parts = dict(item.strip().split("=") for item in data["author"].split(";") if "=" in item)
-                        embed.set_author(name=replace_vars(author_parts.get("name", ""), ctx), icon_url=author_parts.get("icon"))
-                    except Exception:
-                        return await ctx.warn("Invalid author format. Use `name=...; icon=...`")
-                else:
-                    embed.set_author(name=replace_vars(data["author"], ctx))
-            if "thumbnail" in data:
-                embed.set_thumbnail(url=data["thumbnail"])
-            if "image" in data:
-                embed.set_image(url=data["image"])
-            if "timestamp" in data and data["timestamp"].lower() == "now":
-                embed.timestamp = discord.utils.utcnow()
-
-            for key in sorted(k for k in data if k.startswith("field")):
-                content = data[key]
-                try:
-                    parts = dict(item.strip().split("=") for item in content.split(";") if "=" in item)
-                    name = parts.get("name", "​")
-                    value = parts.get("value", "​")
-                    inline = parts.get("inline", "true").lower() == "true"
-                    embed.add_field(name=replace_vars(name, ctx), value=replace_vars(value, ctx), inline=inline)
-                except Exception:
-                    await ctx.warn(f"Failed to parse field: `{key}`. Use format `name=...; value=...; inline=true`")
-                    continue
+        self.message_channels[message.id] = message.channel.id
+        if len(self.message_channels) > self.message_channels_size:
+            self.message_channels.popitem(last=False)
 
-            await ctx.send(content=message_content or None, embed=embed)
+    async def resolve_message(self, guild: discord.Guild, message_id: int, channel_id: int = None) -> Optional[Message]:
+        """
+        Find a message in ``guild`` by ID. Checks the message cache, then
+        the known channel (from a link, the recent-message index or an
+        existing button row), and only then probes every text channel, a
+        few at a time, stopping at the first hit.
+        """
 
-        except Exception as e:
-            await ctx.warn(f"Embed error: {e}")
+        cached = discord.utils.get(self.bot.cached_messages, id=message_id)
+        if cached and cached.guild and cached.guild.id == guild.id:
+            return cached
 
+        channel_id = channel_id or self.message_channels.get(message_id) or await self.bot.pool.fetchval(
+            "SELECT channel_id FROM persistent_buttons WHERE guild_id = $1 AND message_id = $2 LIMIT 1",
+            guild.id, message_id
+        )
+        if channel_id:
+            channel = guild.get_channel(channel_id)
+            if not channel:
+                return None
+            try:
+                return await channel.fetch_message(message_id)
+            except discord.HTTPException:
+                return None
 
-class Persistent(Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.bot_button_rows = []
+        channels = [
+            channel for channel in guild.text_channels
+            if channel.permissions_for(guild.me).read_message_history
+        ]
+        semaphore = asyncio.Semaphore(8)
+
+        async def probe(channel: discord.TextChannel) -> Optional[Message]:
+            async with semaphore:
+                try:
+                    return await channel.fetch_message(message_id)
+                except discord.HTTPException:
+                    return None
+
+        tasks = [asyncio.create_task(probe(channel)) for channel in channels]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                if message := await next_done:
+                    return message
+        finally:
+            for task in tasks:
+                task.cancel()
+        return None
 
     @group(name="button", aliases=["buttons"], usage='button', invoke_without_command=True)
     @hybrid_permissions(manage_messages=True)
@@ -367,23 +336,7 @@ class Persistent(Cog):
             if not existing:
                 return await ctx.warn("You can only have persistent buttons on **5 messages per server**.")
 
-        target: Message = None
-        if channel_id:
-            channel = ctx.guild.get_channel(channel_id)
-            if channel:
-                try:
-                    target = await channel.fetch_message(msg_id)
-                except:
-                    pass
-        else:
-            for channel in ctx.guild.text_channels:
-                try:
-                    target = await channel.fetch_message(int(msg_id))
-                    if target:
-                        break
-                except:
-                    continue
-
+        target = await self.resolve_message(ctx.guild, msg_id, channel_id)
         if not target:
             return await ctx.warn("Could not find the target message.")
 
@@ -444,6 +397,12 @@ class Persistent(Cog):
             if label.strip().lower() in existing_labels:
                 return await ctx.warn(f"A button with the label `{label}` already exists on [`this message`]({target.jump_url})")
 
+            if message_text.strip().startswith("{embed}"):
+                try:
+                    parse_script(message_text, strict=True)
+                except ScriptError as e:
+                    return await ctx.warn(str(e))
+
             custom_id = str(uuid.uuid4())[:8]
             await self.bot.pool.execute(
                 """
@@ -469,35 +428,11 @@ class Persistent(Cog):
             ctx.guild.id, target.id
         )
 
-        view = ui.View(timeout=None)
-        for r in records:
-            button = ui.Button(
-                label=r["label"],
-                style=ButtonStyle(r["style"]),
-                emoji=r["emoji"],
-                custom_id=r["custom_id"]
-            )
-
-            async def make_callback(resp: str):
-                if resp.strip().startswith("{embed}"):
-                    async def callback(interaction: Interaction):
-                        try:
-                            ctx_like = await self.bot.get_context(interaction.message)
-                            embed = await build_embed_from_raw(self.bot, ctx_like, resp)
-                            await interaction.response.send_message(embed=embed, ephemeral=True)
-                        except Exception as e:
-                            await interaction.response.send_message(f"Failed to build embed: {e}", ephemeral=True)
-                    return callback
-                else:
-                    async def callback(interaction: Interaction):
-                        await interaction.response.send_message(resp, ephemeral=True)
-                    return callback
-
-            button.callback = await make_callback(r["response"])
-            view.add_item(button)
-
+        view = button_view(records)
         await target.edit(view=view)
-        self.bot.add_view(view)
+        for r in records:
+            self.responses[r["custom_id"]] = ButtonResponse(r["response"])
+        self.button_messages[target.id] = (ctx.guild.id, target.channel.id)
 
         count = len(sections)
         word = "button" if count == 1 else "buttons"
@@ -562,34 +497,15 @@ class Persistent(Cog):
                 "DELETE FROM persistent_buttons WHERE custom_id = $1",
                 b["custom_id"]
             )
+            self.responses.pop(b["custom_id"], None)
+        if len(to_delete) == len(buttons):
+            self.button_messages.pop(msg_id, None)
         if message:
             remaining = await self.bot.pool.fetch(
                 "SELECT custom_id, label, style, emoji, response FROM persistent_buttons WHERE guild_id = $1 AND message_id = $2",
                 ctx.guild.id, msg_id
             )
-
-            if remaining:
-                view = ui.View(timeout=None)
-                for r in remaining:
-                    btn = ui.Button(
-                        label=r["label"],
-                        style=ButtonStyle(r["style"]),
-                        emoji=r["emoji"],
-                        custom_id=r["custom_id"]
-                    )
-
-                    async def make_cb(resp):
-                        async def cb(interaction):
-                            await interaction.response.send_message(resp, ephemeral=True)
-                        return cb
-
-                    btn.callback = await make_cb(r["response"])
-                    view.add_item(btn)
-
-                await message.edit(view=view)
-                self.bot.add_view(view)
-            else:
-                await message.edit(view=None)
+            await message.edit(view=button_view(remaining) if remaining else None)
 
         jump_url = message.jump_url if message else f"https://discord.com/channels/{ctx.guild.id}/{channel_id}/{msg_id}"
         count = len(to_delete)
@@ -638,10 +554,13 @@ class Persistent(Cog):
         except:
             return await ctx.warn("Failed to remove buttons from the message.")
 
-        deleted = await self.bot.pool.execute(
-            "DELETE FROM persistent_buttons WHERE guild_id = $1 AND message_id = $2",
+        deleted = await self.bot.pool.fetch(
+            "DELETE FROM persistent_buttons WHERE guild_id = $1 AND message_id = $2 RETURNING custom_id",
             ctx.guild.id, msg_id
         )
+        for r in deleted:
+            self.responses.pop(r["custom_id"], None)
+        self.button_messages.pop(msg_id, None)
 
         await ctx.approve(f"Removed **all buttons** from [`this message`]({message.jump_url})")
 
@@ -672,146 +591,17 @@ class Persistent(Cog):
             except:
                 continue
 
-        await self.bot.pool.execute("DELETE FROM persistent_buttons WHERE guild_id = $1", ctx.guild.id)
+        deleted = await self.bot.pool.fetch(
+            "DELETE FROM persistent_buttons WHERE guild_id = $1 RETURNING custom_id",
+            ctx.guild.id
+        )
+        for r in deleted:
+            self.responses.pop(r["custom_id"], None)
+        for message_id in [m for m, (g, _) in self.button_messages.items() if g == ctx.guild.id]:
+            del self.button_messages[message_id]
         await ctx.approve(f"Cleared **{removed}** message{'s' if removed != 1 else ''} with persistent buttons")
 
 
-    async def start(self):
-        print("[Persistent] Initializing persistent buttons...")
-        try:
-            rows = await self.bot.pool.fetch("SELECT guild_id, channel_id, message_id, custom_id, label, style, emoji, response FROM persistent_buttons")
-            if not rows:
-                print("[Persistent] No persistent buttons found")
-                return
-
-            grouped = {}
-            for r in rows:
-                key = (r["guild_id"], r["channel_id"], r["message_id"])
-                grouped.setdefault(key, []).append(r)
-
-            total_messages = len(grouped)
-            processed = 0
-            failed = 0
-
-            print(f"[Persistent] Processing {total_messages} messages with buttons...")
-
-            for (g_id, ch_id, msg_id), items in grouped.items():
-                try:
-                    guild = self.bot.get_guild(g_id)
-                    if not guild:
-                        failed += 1
-                        continue
-
-                    channel = guild.get_channel(ch_id)
-                    if not channel:
-                        failed += 1
-                        continue
-
-                    try:
-                        message = await channel.fetch_message(msg_id)
-                    except discord.NotFound:
-                        await self.bot.pool.execute(
-                            "DELETE FROM persistent_buttons WHERE guild_id = $1 AND message_id = $2",
-                            g_id, msg_id
-                        )
-                        failed += 1
-                        print(f"[Persistent] Message {msg_id} in guild {g_id} not found. Removed from DB.")
-                        continue
-                    except Exception as e:
-                        failed += 1
-                        print(f"[Persistent] Failed to fetch message {msg_id} in guild {g_id}: {e}")
-                        continue
-
-                    view = ui.View(timeout=None)
-                    for r in items:
-                        btn = ui.Button(
-                            label=r["label"],
-                            style=ButtonStyle(r["style"]),
-                            emoji=r["emoji"],
-                            custom_id=r["custom_id"]
-                        )
-
-                        async def make_cb(response_copy):
-                            if response_copy.strip().startswith("{embed}"):
-                                async def cb(interaction):
-                                    try:
-                                        ctx_like = await self.bot.get_context(interaction.message)
-                                        embed = await build_embed_from_raw(self.bot, ctx_like, response_copy)
-                                        await interaction.response.send_message(embed=embed, ephemeral=True)
-                                    except Exception as e:
-                                        await interaction.response.send_message(f"Failed to rebuild embed: {e}", ephemeral=True)
-                                return cb
-                            else:
-                                async def cb(interaction):
-                                    await interaction.response.send_message(response_copy, ephemeral=True)
-                                return cb
-
-                        btn.callback = await make_cb(str(r["response"]))
-                        view.add_item(btn)
-
-                    try:
-                        await message.edit(view=view)
-                        await asyncio.sleep(3.0)
-                    except discord.HTTPException as e:
-                        failed += 1
-                        print(f"[Persistent] Failed to reapply view to message {msg_id}: {e}")
-                        if "emoji" in str(e) or "Invalid" in str(e):
-                            await self.bot.pool.execute(
-                                "DELETE FROM persistent_buttons WHERE guild_id = $1 AND message_id = $2",
-                                g_id, msg_id
-                            )
-                            print(f"[Persistent] Deleted invalid buttons for message {msg_id} due to error")
-                        continue
-
-                    self.bot.add_view(view)
-                    processed += 1
-
-                except Exception as e:
-                    failed += 1
-                    continue
-
-            print(f"[Persistent] Loaded {processed} button views, {failed} failed")
-
-            if failed > 0:
-                asyncio.create_task(self._cleanup_orphaned_buttons())
-
-        except Exception as e:
-            print(f"[Persistent] Failed to initialize: {e}")
-
-    async def _cleanup_orphaned_buttons(self):
-        await asyncio.sleep(30)
-        try:
-            rows = await self.bot.pool.fetch("SELECT DISTINCT guild_id, channel_id, message_id FROM persistent_buttons")
-            to_remove = []
-            
-            for row in rows:
-                guild = self.bot.get_guild(row['guild_id'])
-                if not guild:
-                    to_remove.append((row['guild_id'], row['channel_id'], row['message_id']))
-                    continue
-                    
-                channel = guild.get_channel(row['channel_id'])
-                if not channel:
-                    to_remove.append((row['guild_id'], row['channel_id'], row['message_id']))
-            
-            if to_remove:
-                for guild_id, channel_id, message_id in to_remove:
-                    await self.bot.pool.execute(
-                        "DELETE FROM persistent_buttons WHERE guild_id = $1 AND channel_id = $2 AND message_id = $3",
-                        guild_id, channel_id, message_id
-                    )
-                print(f"[Persistent] Cleaned up {len(to_remove)} orphaned button records")
-        except Exception as e:
-            print(f"[Persistent] Cleanup failed: {e}")
-
-
 async def setup(bot: Bot):
-    persistent = Persistent(bot)
-    await bot.add_cog(Embeds(bot))    
-    await bot.add_cog(persistent)
-    
-    async def delayed_start():
-        await asyncio.sleep(2)
-        await persistent.start()
-    
-    bot.loop.create_task(delayed_start())
+    await bot.add_cog(Embeds(bot))
+    await bot.add_cog(Persistent(bot))
@@ -0,0 +1,190 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import discord
+from discord.ext.commands import Context
+
+from .template import Template, compile_template
+
+ALLOWED_KEYS = {
+    "title", "description", "color", "footer", "author",
+    "thumbnail", "image", "timestamp"
+}
+
+
+class ScriptError(ValueError):
+    """Raised by a strict parse when an embed script is malformed."""
+
+
+def _options(value: str) -> Dict[str, str]:
+    """Split ``key=value; key=value`` blocks such as footers and fields."""
+
+    options = {}
+    for item in value.split(";"):
+        if "=" in item:
+            key, option = item.split("=", 1)
+            options[key.strip()] = option.strip()
+    return options
+
+
+class EmbedScript:
+    """
+    An ``{embed}$v{key: value}`` script compiled once.
+
+    Text slots are compiled templates, and colour, URLs and flags are
+    resolved at compile time. ``render`` only has to fill in variables.
+    """
+
+    __slots__ = (
+        "message", "title", "description", "color", "footer", "footer_icon",
+        "author", "author_icon", "thumbnail", "image", "timestamp", "fields",
+    )
+
+    def __init__(self):
+        self.message: Optional[Template] = None
+        self.title: Optional[Template] = None
+        self.description: Optional[Template] = None
+        self.color: Optional[int] = None
+        self.footer: Optional[Template] = None
+        self.footer_icon: Optional[str] = None
+        self.author: Optional[Template] = None
+        self.author_icon: Optional[str] = None
+        self.thumbnail: Optional[str] = None
+        self.image: Optional[str] = None
+        self.timestamp = False
+        self.fields: List[Tuple[Template, Template, bool]] = []
+
+    @property
+    def static(self) -> bool:
+        """True when every render produces the same message and embed."""
+
+        templates = [self.message, self.title, self.description, self.footer, self.author]
+        templates.extend(template for field in self.fields for template in field[:2])
+        return not self.timestamp and all(t is None or t.static for t in templates)
+
+    @property
+    def variables(self) -> frozenset:
+        templates = [self.message, self.title, self.description, self.footer, self.author]
+        templates.extend(template for field in self.fields for template in field[:2])
+        return frozenset().union(*(t.variables for t in templates if t is not None))
+
+    def render(self, ctx: Context, extra: Optional[dict] = None) -> Tuple[str, discord.Embed]:
+        embed = discord.Embed()
+        if self.title:
+            embed.title = self.title.render(ctx, extra)
+        if self.description:
+            embed.description = self.description.render(ctx, extra)
+        if self.color is not None:
+            embed.color = discord.Color(self.color)
+        if self.footer:
+            embed.set_footer(text=self.footer.render(ctx, extra), icon_url=self.footer_icon)
+        if self.author:
+            embed.set_author(name=self.author.render(ctx, extra), icon_url=self.author_icon)
+        if self.thumbnail:
+            embed.set_thumbnail(url=self.thumbnail)
+        if self.image:
+            embed.set_image(url=self.image)
+        if self.timestamp:
+            embed.timestamp = discord.utils.utcnow()
+        for name, value, inline in self.fields:
+            embed.add_field(name=name.render(ctx, extra), value=value.render(ctx, extra), inline=inline)
+
+        message = self.message.render(ctx, extra) if self.message else ""
+        return message, embed
+
+
+def parse_script(raw: str, strict: bool = False) -> EmbedScript:
+    """
+    Compile an embed script.
+
+    A strict parse raises ScriptError for anything ``embed create`` would
+    reject, and is used to validate scripts before they are saved. A
+    lenient parse skips malformed blocks, as rendering always has.
+    """
+
+    data: Dict[str, str] = {}
+    fields: List[str] = []
+    message = None
+
+    for part in raw.split("$v"):
+        stripped = part.strip()
+        if not stripped or stripped.lower() == "{embed}":
+            continue
+
+        if stripped.startswith("{message:") and stripped.endswith("}"):
+            message = stripped[9:-1].strip()
+            continue
+        if stripped.lower().startswith("message:"):
+            message = stripped[8:].strip()
+            continue
+
+        if not stripped.startswith("{") or not stripped.endswith("}"):
+            if strict:
+                raise ScriptError(f"Missing opening or closing bracket: `{stripped}`")
+            continue
+
+        content = stripped[1:-1].strip()
+        if ":" not in content:
+            if strict:
+                raise ScriptError(f"Missing colon (`:`) in block: `{stripped}`")
+            continue
+
+        key, value = content.split(":", 1)
+        key = key.strip().lower()
+        value = value.strip()
+
+        if key.startswith("field"):
+            fields.append(value)
+            continue
+        if strict and key in data:
+            raise ScriptError(f"Duplicate key `{key}` detected.")
+        if strict and key not in ALLOWED_KEYS:
+            raise ScriptError(f"Unknown embed key: `{key}`")
+        data[key] = value
+
+    script = EmbedScript()
+    if message:
+        script.message = compile_template(message)
+    if "title" in data:
+        script.title = compile_template(data["title"])
+    if "description" in data:
+        script.description = compile_template(data["description"])
+    if "color" in data:
+        try:
+            script.color = int(data["color"].lstrip("#"), 16)
+        except ValueError:
+            if strict:
+                raise ScriptError(f"Invalid hex color: `{data['color']}`")
+            script.color = 0
+    if "footer" in data:
+        if ";" in data["footer"]:
+            options = _options(data["footer"])
+            script.footer = compile_template(options.get("text", ""))
+            script.footer_icon = options.get("icon")
+        else:
+            script.footer = compile_template(data["footer"])
+    if "author" in data:
+        if ";" in data["author"]:
+            options = _options(data["author"])
+            script.author = compile_template(options.get("name", ""))
+            script.author_icon = options.get("icon")
+        else:
+            script.author = compile_template(data["author"])
+    script.thumbnail = data.get("thumbnail")
+    script.image = data.get("image")
+    script.timestamp = data.get("timestamp", "").lower() == "now"
+
+    for value in fields:
+        options = _options(value)
+        script.fields.append((
+            compile_template(options.get("name", "\u200b")),
+            compile_template(options.get("value", "\u200b")),
+            options.get("inline", "true").lower() == "true",
+        ))
+
+    return script
+
+
+@lru_cache(maxsize=2048)
+def compile_script(raw: str) -> EmbedScript:
+    return parse_script(raw)
@@ -0,0 +1,78 @@
+from functools import lru_cache
+import re
+from typing import List, Optional, Tuple, Union
+
+from discord.ext.commands import Context
+
+from .variables import VARIABLES
+
+# {variable} or <@username>, matched in one pass over the raw template.
+TOKEN = re.compile(r"\{([^{}\s]+)\}|<@([a-zA-Z0-9_]+)>")
+
+VAR = 0
+MENTION = 1
+
+# A literal string, or (kind, name, raw) where raw is the original text
+# kept for anything that does not resolve.
+Part = Union[str, Tuple[int, str, str]]
+
+
+def resolve_mention(ctx: Context, name: str) -> Optional[str]:
+    user = ctx.bot.name_index.find(ctx.guild, name)
+    return user.mention if user else None
+
+
+class Template:
+    """A template split into literals, variable slots and mention slots."""
+
+    __slots__ = ("parts", "variables")
+
+    def __init__(self, text: str):
+        self.parts: List[Part] = []
+        position = 0
+        for match in TOKEN.finditer(text):
+            if match.start() > position:
+                self.parts.append(text[position:match.start()])
+            if match.group(1) is not None:
+                self.parts.append((VAR, match.group(1), match.group(0)))
+            else:
+                self.parts.append((MENTION, match.group(2), match.group(0)))
+            position = match.end()
+        if position < len(text):
+            self.parts.append(text[position:])
+
+        self.variables = frozenset(part[1] for part in self.parts if type(part) is tuple and part[0] == VAR)
+
+    @property
+    def static(self) -> bool:
+        """True when rendering cannot depend on the context."""
+
+        return all(type(part) is str for part in self.parts)
+
+    def render(self, ctx: Context, extra: Optional[dict] = None) -> str:
+        values = {}
+        output = []
+        for part in self.parts:
+            if type(part) is str:
+                output.append(part)
+                continue
+
+            kind, name, raw = part
+            if kind == MENTION:
+                output.append(resolve_mention(ctx, name) or raw)
+            elif extra and name in extra:
+                output.append(str(extra[name]))
+            elif name in values:
+                output.append(values[name])
+            elif provider := VARIABLES.get(name):
+                value = values[name] = str(provider(ctx))
+                output.append(value)
+            else:
+                output.append(raw)
+
+        return "".join(output)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(text: str) -> Template:
+    return Template(text)
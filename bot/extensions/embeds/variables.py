@@ -0,0 +1,139 @@
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from babel.dates import format_date
+from discord.ext.commands import Context
+import humanize
+
+PST = timezone(timedelta(hours=-8))
+
+
+def _now_utc() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _now_pst() -> datetime:
+    return _now_utc().astimezone(PST)
+
+
+def join_position(ctx: Context):
+    position = ctx.bot.join_index.position(ctx.guild, ctx.author.id)
+    return position if position else "N/A"
+
+
+def join_position_suffix(ctx: Context) -> str:
+    position = join_position(ctx)
+    return f"{position}th" if position != "N/A" else "N/A"
+
+
+def level_rank(ctx: Context) -> str:
+    leveling = ctx.bot.get_cog("Leveling")
+    rank = leveling.leaderboards.peek_rank(ctx.guild.id, ctx.author.id) if leveling else None
+    return f"{rank.position:,}" if rank else "N/A"
+
+
+async def resolve_deferred(ctx: Context, variables: frozenset, extra: Optional[dict]) -> Optional[dict]:
+    """
+    Resolve the variables that need an await ahead of a render, and
+    return ``extra`` with them added. ``level.rank`` may need its board
+    loaded first; without this, the provider above only sees boards that
+    are already loaded.
+    """
+
+    if "level.rank" in variables and not (extra and "level.rank" in extra):
+        leveling = ctx.bot.get_cog("Leveling")
+        if leveling and ctx.guild:
+            rank = await leveling.rank(ctx.guild.id, ctx.author.id)
+            extra = {**(extra or {}), "level.rank": f"{rank.position:,}" if rank else "N/A"}
+    return extra
+
+
+# Template variable -> provider. Providers are only called for the
+# variables a template actually references.
+VARIABLES: Dict[str, Callable[[Context], Any]] = {
+    # Guild vars
+    "guild.name": lambda ctx: ctx.guild.name,
+    "guild.id": lambda ctx: ctx.guild.id,
+    "guild.member_count": lambda ctx: ctx.guild.member_count,
+    "guild.region": lambda ctx: getattr(ctx.guild, "region", "N/A"),
+    "guild.shard": lambda ctx: ctx.guild.shard_id,
+    "guild.owner_id": lambda ctx: ctx.guild.owner_id,
+    "guild.created_at": lambda ctx: format_date(ctx.guild.created_at, format="long", locale="en"),
+    "guild.created_at_timestamp": lambda ctx: f"<t:{int(ctx.guild.created_at.timestamp())}:R>",
+    "guild.created_at_humanized": lambda ctx: humanize.naturaltime(datetime.now(timezone.utc) - ctx.guild.created_at),
+    "guild.emoji_count": lambda ctx: len(ctx.guild.emojis),
+    "guild.role_count": lambda ctx: len(ctx.guild.roles),
+    "guild.boost_count": lambda ctx: ctx.guild.premium_subscription_count,
+    "guild.boost_tier": lambda ctx: getattr(ctx.guild, "premium_tier", "No Level"),
+    "guild.preferred_locale": lambda ctx: ctx.guild.preferred_locale,
+    "guild.key_features": lambda ctx: ctx.guild.features,
+    "guild.icon": lambda ctx: ctx.guild.icon.url if ctx.guild.icon else "N/A",
+    "guild.banner": lambda ctx: ctx.guild.banner.url if ctx.guild.banner else "N/A",
+    "guild.splash": lambda ctx: ctx.guild.splash.url if ctx.guild.splash else "N/A",
+    "guild.discovery": lambda ctx: ctx.guild.discovery_splash.url if ctx.guild.discovery_splash else "N/A",
+    "guild.max_presences": lambda ctx: ctx.guild.max_presences,
+    "guild.max_members": lambda ctx: ctx.guild.max_members,
+    "guild.max_video_channel_users": lambda ctx: ctx.guild.max_video_channel_users,
+    "guild.afk_timeout": lambda ctx: ctx.guild.afk_timeout,
+    "guild.afk_channel": lambda ctx: ctx.guild.afk_channel.name if ctx.guild.afk_channel else "N/A",
+    "guild.channels_count": lambda ctx: len(ctx.guild.channels),
+    "guild.text_channels_count": lambda ctx: len(ctx.guild.text_channels),
+    "guild.voice_channels_count": lambda ctx: len(ctx.guild.voice_channels),
+    "guild.category_channels_count": lambda ctx: len(ctx.guild.categories),
+
+    # User vars
+    "user": lambda ctx: str(ctx.author),
+    "user.id": lambda ctx: ctx.author.id,
+    "user.mention": lambda ctx: ctx.author.mention,
+    "user.name": lambda ctx: ctx.author.name,
+    "user.tag": lambda ctx: f"{ctx.author.discriminator:0>4}",
+    "user.avatar": lambda ctx: ctx.author.avatar.url if ctx.author.avatar else "N/A",
+    "user.guild_avatar": lambda ctx: ctx.author.guild_avatar.url if ctx.author.guild_avatar else "N/A",
+    "user.display_avatar": lambda ctx: ctx.author.display_avatar.url,
+    "user.joined_at": lambda ctx: format_date(ctx.author.joined_at, format="long", locale="en") if ctx.author.joined_at else "N/A",
+    "user.joined_at_timestamp": lambda ctx: f"<t:{int(ctx.author.joined_at.timestamp())}:R>" if ctx.author.joined_at else "N/A",
+    "user.created_at": lambda ctx: format_date(ctx.author.created_at, format="long", locale="en"),
+    "user.created_at_timestamp": lambda ctx: f"<t:{int(ctx.author.created_at.timestamp())}:R>",
+    "user.display_name": lambda ctx: ctx.author.display_name,
+    "user.boost": lambda ctx: "Yes" if ctx.author.premium_since else "No",
+    "user.boost_since": lambda ctx: format_date(ctx.author.premium_since, format="long", locale="en") if ctx.author.premium_since else "N/A",
+    "user.boost_since_timestamp": lambda ctx: f"<t:{int(ctx.author.premium_since.timestamp())}:R>" if ctx.author.premium_since else "N/A",
+    "user.color": lambda ctx: str(ctx.author.top_role.color) if ctx.author.top_role else "N/A",
+    "user.top_role": lambda ctx: ctx.author.top_role.name if ctx.author.top_role else "N/A",
+    "user.role_list": lambda ctx: ", ".join(role.name for role in ctx.author.roles if role.name != "@everyone"),
+    "user.role_text_list": lambda ctx: ", ".join([r.name for r in ctx.author.roles if r.name != "@everyone"]),
+    "user.bot": lambda ctx: "Yes" if ctx.author.bot else "No",
+    "user.badges_icons": lambda ctx: "N/A",
+    "user.badges": lambda ctx: "N/A",
+    "user.join_position": lambda ctx: join_position(ctx),
+    "user.join_position_suffix": lambda ctx: join_position_suffix(ctx),
+
+    # Level vars
+    "level.rank": lambda ctx: level_rank(ctx),
+
+    # Channel vars
+    "channel.name": lambda ctx: ctx.channel.name,
+    "channel.id": lambda ctx: ctx.channel.id,
+    "channel.mention": lambda ctx: ctx.channel.mention,
+    "channel.topic": lambda ctx: getattr(ctx.channel, "topic", "N/A"),
+    "channel.type": lambda ctx: str(ctx.channel.type),
+    "channel.category_id": lambda ctx: ctx.channel.category_id if ctx.channel.category_id else "N/A",
+    "channel.category_name": lambda ctx: ctx.channel.category.name if ctx.channel.category else "N/A",
+    "channel.position": lambda ctx: ctx.channel.position,
+    "channel.slowmode_delay": lambda ctx: getattr(ctx.channel, "slowmode_delay", 0),
+
+    # Date and time vars
+    "date.now": lambda ctx: _now_pst().strftime("%B %d, %Y"),
+    "date.utc_timestamp": lambda ctx: int(_now_utc().timestamp()),
+    "date.now_proper": lambda ctx: _now_pst().strftime("%A, %B %d, %Y"),
+    "date.now_short": lambda ctx: _now_pst().strftime("%b %d, %Y"),
+    "date.now_shorter": lambda ctx: _now_pst().strftime("%m/%d/%y"),
+    "time.now": lambda ctx: _now_pst().strftime("%I:%M %p"),
+    "time.now_military": lambda ctx: _now_pst().strftime("%H:%M"),
+    "date.utc_now": lambda ctx: _now_utc().strftime("%B %d, %Y"),
+    "date.utc_now_proper": lambda ctx: _now_utc().strftime("%A, %B %d, %Y"),
+    "date.utc_now_short": lambda ctx: _now_utc().strftime("%b %d, %Y"),
+    "date.utc_now_shorter": lambda ctx: _now_utc().strftime("%m/%d/%y"),
+    "time.utc_now": lambda ctx: _now_utc().strftime("%I:%M %p"),
+    "time.utc_now_military": lambda ctx: _now_utc().strftime("%H:%M"),
+}
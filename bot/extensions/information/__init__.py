@@ -1616,8 +1616,7 @@ class Prefix(Cog):
     @group(invoke_without_command=True, usage='prefix')
     async def prefix(self, ctx: Context):
         """View the current prefix for the guild"""
-        query = "SELECT prefix FROM config WHERE guild_id = $1"
-        prefix = await self.bot.pool.fetchval(query, ctx.guild.id) or "!"  
+        prefix = await self.bot.prefixes.guild(ctx.guild.id) or "!"
         return await ctx.config(f"The prefix for this server is `{prefix}`")
 
     @prefix.command(name="set", aliases=("change", "update"), usage='prefix set [prefix]')
@@ -1634,19 +1633,20 @@ class Prefix(Cog):
         DO UPDATE SET prefix = excluded.prefix
         """
         await self.bot.pool.execute(query, ctx.guild.id, prefix_)
+        self.bot.prefixes.set_guild(ctx.guild.id, prefix_)
         return await ctx.approve(f"Now using `{prefix_}` as the server prefix")
 
     @prefix.command(name="remove", aliases=("reset", "clear"), usage='prefix remove')
     @hybrid_permissions(manage_guild=True)
     async def prefix_remove(self, ctx: Context):
         """Remove the custom prefix and use the default prefix"""
-        query = "SELECT prefix FROM config WHERE guild_id = $1"
-        prefix = await self.bot.pool.fetchval(query, ctx.guild.id)
+        prefix = await self.bot.prefixes.guild(ctx.guild.id)
         if not prefix:
             return await ctx.warn("There isn't a custom prefix set")
 
         query = "UPDATE config SET prefix = NULL WHERE guild_id = $1"
         await self.bot.pool.execute(query, ctx.guild.id)
+        self.bot.prefixes.set_guild(ctx.guild.id, None)
         return await ctx.approve("The server prefix has been reset")
 
     @prefix.group(name="self", aliases=("me",), invoke_without_command=True, usage='prefix self [prefix]')
@@ -1662,6 +1662,7 @@ class Prefix(Cog):
         DO UPDATE SET prefix = excluded.prefix
         """
         await self.bot.pool.execute(query, ctx.author.id, prefix_)
+        await self.bot.prefixes.update_user(ctx.author.id, prefix_)
         return await ctx.approve(f"Your prefix has been set to `{prefix_}`")
 
     @prefix_self.command(name="remove", aliases=("reset", "clear"), usage='prefix self remove')
@@ -1669,18 +1670,19 @@ class Prefix(Cog):
         """Remove your custom prefix and use the server prefix"""
         query = "UPDATE user_config SET prefix = NULL WHERE user_id = $1"
         await self.bot.pool.execute(query, ctx.author.id)
+        await self.bot.prefixes.update_user(ctx.author.id, None)
         return await ctx.approve("Your prefix has been reset")
 
 
     @Cog.listener()
     async def on_guild_join(self, guild):
         """Set a default prefix when the bot joins a new guild."""
-        query = "SELECT prefix FROM config WHERE guild_id = $1"
-        prefix = await self.bot.pool.fetchval(query, guild.id)
+        prefix = await self.bot.prefixes.guild(guild.id)
 
         if not prefix:
             query = "INSERT INTO config (guild_id, prefix) VALUES($1, $2)"
             await self.bot.pool.execute(query, guild.id, "!")
+            self.bot.prefixes.set_guild(guild.id, "!")
             print(f"[AUTO-PREFIX] Set default prefix '!' for {guild.name} ({guild.id}) - {guild.member_count} members")
 
     @Cog.listener()
@@ -1703,12 +1705,12 @@ class Prefix(Cog):
 
         missing_prefixes = 0
         for guild in self.bot.guilds:
-            query = "SELECT prefix FROM config WHERE guild_id = $1"
-            prefix = await self.bot.pool.fetchval(query, guild.id)
+            prefix = await self.bot.prefixes.guild(guild.id)
             
             if not prefix:
                 query = "INSERT INTO config (guild_id, prefix) VALUES($1, $2)"
                 await self.bot.pool.execute(query, guild.id, "!")
+                self.bot.prefixes.set_guild(guild.id, "!")
                 missing_prefixes += 1
         
         if missing_prefixes > 0:
@@ -120,8 +120,8 @@ class LastFM(Cog):
                         embed = await build_embed_from_raw(self.bot, ctx, custom_command["embed_data"], extra=sanitized_vars)
                         message = await ctx.send(embed=embed)
                     else:
-                        from bot.extensions.embeds import replace_vars
-                        content = replace_vars(custom_command["embed_data"], ctx, extra=sanitized_vars)
+                        from bot.extensions.embeds import render_vars
+                        content = await render_vars(custom_command["embed_data"], ctx, extra=sanitized_vars)
                         message = await ctx.send(content)
                     
                     settings = await self.bot.pool.fetchrow(
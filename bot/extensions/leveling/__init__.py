@@ -1,20 +1,49 @@
 from discord.ext import commands
 from discord.ext.commands import Cog, Context, cooldown, BucketType
-from typing import Optional
-import discord, re, difflib, asyncio
+from typing import Dict, Optional
+import discord, re, difflib
 from datetime import datetime
 from bot.shared.paginator import Paginator
-from ..embeds import replace_vars, build_embed_from_raw
+from ..embeds import replace_vars, render_vars, build_embed_from_raw, parse_script
 from bot.shared.fakeperms import hybrid_permissions
 
 
-from .core import LevelManager, DEFAULT_SPEED
+from .core import LevelManager, DEFAULT_SPEED, LEADERBOARD_SIZE
+from .settings import SettingsCache
+from .ledger import XPLedger
+from .sync import RoleSync
+from .leaderboard import Leaderboards, Rank, UserNames
+from .pipeline import LevelUp, LevelUpPipeline
 
 
 class Leveling(Cog):
     def __init__(self, bot):
         self.bot = bot
         self.manager = LevelManager(bot.pool)
+        self.settings = SettingsCache(bot.pool)
+        self.leaderboards = Leaderboards(bot.pool)
+        self.user_names = UserNames(bot)
+        self.ledger = XPLedger(bot.pool, on_flush=self.leaderboards.apply)
+        self.pipeline = LevelUpPipeline(bot, self.leaderboards)
+        # Role syncs by guild, kept after an interruption so they can resume.
+        self.role_syncs: Dict[int, RoleSync] = {}
+
+    async def cog_load(self):
+        self.ledger.start()
+        self.pipeline.start()
+
+    async def rank(self, guild_id: int, user_id: int) -> Optional[Rank]:
+        """Rank with the user's unflushed XP folded in, loading the board if needed."""
+
+        entry = self.ledger.peek(user_id, guild_id)
+        if entry and entry.dirty:
+            return await self.leaderboards.rank(guild_id, user_id, entry.xp, entry.level)
+        return await self.leaderboards.rank(guild_id, user_id)
+
+    async def cog_unload(self):
+        self.user_names.close()
+        await self.pipeline.close()
+        await self.ledger.close()
 
     @commands.Cog.listener()
     async def on_guild_role_delete(self, role: discord.Role):
@@ -22,6 +51,7 @@ class Leveling(Cog):
             "DELETE FROM level_roles WHERE guild_id = $1 AND role_id = $2",
             role.guild.id, role.id
         )
+        self.settings.invalidate(role.guild.id)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -34,100 +64,34 @@ class Leveling(Cog):
         if len(message.content.strip()) < 5:
             return
 
-        if self.manager.is_spamming(message.author.id):
+        settings = await self.settings.get(message.guild.id)
+        if not settings.enabled:
             return
 
-        ignored = await self.bot.pool.fetch(
-            "SELECT type, target_id FROM level_ignores WHERE guild_id = $1",
-            message.guild.id
-        )
-        ignored_channels = {r["target_id"] for r in ignored if r["type"] == "channel"}
-        ignored_roles = {r["target_id"] for r in ignored if r["type"] == "role"}
-
-        if message.channel.id in ignored_channels:
+        if self.manager.is_spamming(message.guild.id, message.author.id):
             return
 
-        if any(role.id in ignored_roles for role in message.author.roles):
+        if message.channel.id in settings.ignored_channels:
             return
 
-        row = await self.bot.pool.fetchrow(
-            "SELECT speed, enabled, stack_roles FROM leveling_settings WHERE guild_id = $1",
-            message.guild.id
-        )
-        if not row or not row["enabled"]:
+        if settings.ignored_roles and any(role.id in settings.ignored_roles for role in message.author.roles):
             return
 
-        speed = row["speed"] or 3
-        stack_roles = row["stack_roles"]
-        data = await self.manager.get_user_data(message.author.id, message.guild.id)
+        speed = settings.speed
+        entry = await self.ledger.get(message.author.id, message.guild.id)
 
-        if data and self.manager.on_xp_cooldown(data["last_xp"]):
+        if self.manager.on_xp_cooldown(entry.last_xp):
             return
 
         gained = self.manager.generate_xp(speed)
-        old_level = data["level"] if data else 1
-        old_xp = data["xp"] if data else 0
-        new_total = old_xp + gained
+        old_level = entry.level
+        new_total = entry.xp + gained
         new_level = self.manager.get_level_from_xp(new_total)
 
-        await self.bot.pool.execute(
-            """
-            INSERT INTO user_levels (user_id, guild_id, xp, level, last_xp)
-            VALUES ($1, $2, $3, $4, $5)
-            ON CONFLICT (user_id, guild_id)
-            DO UPDATE SET xp = $3, level = $4, last_xp = $5
-            """,
-            message.author.id, message.guild.id, new_total, new_level, datetime.utcnow()
-        )
+        self.ledger.update(entry, new_total, new_level, datetime.utcnow())
 
         if new_level > old_level:
-            msg_row = await self.bot.pool.fetchrow("""
-                SELECT channel_id, message FROM level_messages
-                WHERE guild_id = $1
-            """, message.guild.id)
-
-            reward_row = await self.bot.pool.fetchrow(
-                "SELECT role_id FROM level_roles WHERE guild_id = $1 AND level = $2",
-                message.guild.id, new_level
-            )
-            reward_role = message.guild.get_role(reward_row["role_id"]) if reward_row else None
-
-            if msg_row:
-                channel = message.guild.get_channel(msg_row["channel_id"])
-                if channel:
-                    ctx = await self.bot.get_context(message)
-                    content = msg_row["message"]
-                    extra = {
-                        "level": new_level,
-                        "xp": new_total,
-                        "level.reward": reward_role.name if reward_role else "",
-                        "level.reward_mention": reward_role.mention if reward_role else "",
-                        "level.reward_append": f" and earned {reward_role.mention}!" if reward_role else ""
-                    }
-
-                    if "{embed}" in content:
-                        try:
-                            msg_content, embed = await build_embed_from_raw(self.bot, ctx, content, extra=extra)
-                            await channel.send(content=msg_content or None, embed=embed)
-                        except Exception:
-                            await channel.send(replace_vars(content, ctx, extra=extra).replace("\\n", "\n"))
-                    else:
-                        await channel.send(replace_vars(content, ctx, extra=extra).replace("\\n", "\n"))
-
-            if reward_role and reward_role not in message.author.roles:
-                try:
-                    if not stack_roles:
-                        previous_roles = await self.bot.pool.fetch(
-                            "SELECT role_id FROM level_roles WHERE guild_id = $1 AND level < $2",
-                            message.guild.id, new_level
-                        )
-                        for r in previous_roles:
-                            prev = message.guild.get_role(r["role_id"])
-                            if prev and prev in message.author.roles:
-                                await message.author.remove_roles(prev, reason="Level-up role stacking disabled")
-                    await message.author.add_roles(reward_role, reason="Level-up reward")
-                except Exception:
-                    pass
+            self.pipeline.push(LevelUp(message, new_level, new_total, settings))
 
 
     @commands.hybrid_group(name="levels", usage='levels', aliases=['level'], invoke_without_command=True)
@@ -144,12 +108,13 @@ class Leveling(Cog):
             return await ctx.warn("Leveling is currently **disabled** in this server")
 
         member = member or ctx.author
-        data = await self.manager.get_user_data(member.id, ctx.guild.id)
-        if not data:
+        data = await self.ledger.get(member.id, ctx.guild.id)
+        if not data.last_xp and not data.xp:
             return await ctx.warn("No level data found for that user")
 
-        level = data["level"]
-        xp = data["xp"]
+        level = data.level
+        xp = data.xp
+        rank = await self.leaderboards.rank(ctx.guild.id, member.id, xp, level)
 
         current_level_xp = self.manager.xp_for_level(level)
         next_level_xp = self.manager.xp_for_level(level + 1)
@@ -168,6 +133,8 @@ class Leveling(Cog):
         )
         embed.set_author(name=f"{member.name}", icon_url=member.display_avatar.url)
         embed.set_thumbnail(url=member.display_avatar.url)
+        if rank:
+            embed.description += f"\nRank: **#{rank.position:,}** of {rank.total:,} (top {rank.top})"
         embed.add_field(name="Progress", value=bar, inline=False)
         embed.set_footer(text=f"Total XP earned: {xp:,}")
 
@@ -180,102 +147,64 @@ class Leveling(Cog):
         """
         Syncronize all level roles with users based on their level
         """
-        settings = await self.bot.pool.fetchrow(
-            "SELECT enabled, stack_roles FROM leveling_settings WHERE guild_id = $1",
-            ctx.guild.id
-        )
-
-        if not settings or not settings["enabled"]:
+        settings = await self.settings.get(ctx.guild.id)
+        if not settings.enabled:
             return await ctx.warn("Leveling is currently **disabled** in this server.")
 
-        stack_roles = settings["stack_roles"]
-
-        level_roles = await self.bot.pool.fetch(
-            "SELECT level, role_id FROM level_roles WHERE guild_id = $1 ORDER BY level ASC",
-            ctx.guild.id
-        )
-        if not level_roles:
+        if not settings.rewards:
             return await ctx.warn("There are no level role rewards set for this server")
 
-        level_to_role = {row["level"]: ctx.guild.get_role(row["role_id"]) for row in level_roles}
-        level_order = sorted(level_to_role.keys())
+        job = self.role_syncs.get(ctx.guild.id)
+        if job and job.running:
+            return await ctx.warn(f"A role sync is already running (**{job.processed}/{job.total}** checked)")
 
-        user_levels = await self.bot.pool.fetch(
-            "SELECT user_id, level FROM user_levels WHERE guild_id = $1",
-            ctx.guild.id
-        )
+        # Claim the job before the first await, so a second invocation
+        # sees it running instead of resuming it alongside this one.
+        resumed = job is not None
+        if not resumed:
+            job = self.role_syncs[ctx.guild.id] = RoleSync(ctx.guild)
+        job.running = True
 
-        members_to_update = [ctx.guild.get_member(row["user_id"]) for row in user_levels]
-        members_to_update = [m for m in members_to_update if m is not None]
+        try:
+            await self.ledger.flush()
+            user_levels = await self.bot.pool.fetch(
+                "SELECT user_id, level FROM user_levels WHERE guild_id = $1",
+                ctx.guild.id
+            )
+            # An interrupted job keeps its counts but is planned again from
+            # the current rewards and levels.
+            rewards = {level: ctx.guild.get_role(role_id) for level, role_id in settings.rewards.items()}
+            job.plan(rewards, {row["user_id"]: row["level"] for row in user_levels}, settings.stack_roles)
+
+            if not job.pending:
+                self.role_syncs.pop(ctx.guild.id, None)
+                return await ctx.approve("Every member already has the right level roles")
+
+            verb = "Resuming role sync" if resumed else "Syncing roles"
+            embed = discord.Embed(
+                description=f"<a:slain_load:1392313474310209537> {verb} for **{len(job.pending)}** users...",
+                color=0x7b9fb0
+            )
+            msg = await ctx.send(embed=embed)
+        finally:
+            job.running = False
+
+        async def report(job: RoleSync):
+            embed.description = (
+                f"<a:slain_load:1392313474310209537> {verb}... **{job.processed}/{job.total}**\n"
+                f"-# *Updated **{job.updated}**, failed **{job.failed}***"
+            )
+            try:
+                await msg.edit(embed=embed)
+            except discord.HTTPException:
+                pass
 
-        batch_size = 3
-        sleep_time = 2
-        num_batches = (len(members_to_update) + batch_size - 1) // batch_size
-        total_eta_sec = num_batches * sleep_time
-        eta_minutes = round(total_eta_sec / 60)
-        eta_display = f"{eta_minutes} minute{'s' if eta_minutes != 1 else ''}" if eta_minutes else "under a minute"
+        await job.run(report)
+        self.role_syncs.pop(ctx.guild.id, None)
 
-        embed = discord.Embed(
-            description=f"<a:slain_load:1392313474310209537> Syncing roles for **{len(members_to_update)}** users...\n-# *Estimated time: **{eta_display}***",
-            color=0x7b9fb0
-        )
-        msg = await ctx.send(embed=embed)
-
-        updated = 0
-        counter = 0
-
-        for member in members_to_update:
-            current_level = next((r["level"] for r in user_levels if r["user_id"] == member.id), 0)
-
-            if stack_roles:
-                roles_to_add = [
-                    role for lvl, role in level_to_role.items()
-                    if role and lvl <= current_level and role not in member.roles and role < ctx.guild.me.top_role
-                ]
-                if roles_to_add:
-                    try:
-                        await member.add_roles(*roles_to_add, reason="Level sync (stacking)")
-                        updated += 1
-                    except:
-                        pass
-            else:
-                eligible = [
-                    (lvl, role) for lvl, role in level_to_role.items()
-                    if lvl <= current_level and role and role < ctx.guild.me.top_role
-                ]
-                if not eligible:
-                    continue
-                highest_level, highest_role = max(eligible, key=lambda x: x[0])
-                added_role = False
-                removed_roles = []
-
-                if highest_role not in member.roles:
-                    try:
-                        await member.add_roles(highest_role, reason="Level sync (non-stacking)")
-                        added_role = True
-                    except:
-                        pass
-
-                lower_roles = [
-                    role for lvl, role in level_to_role.items()
-                    if lvl < highest_level and role in member.roles
-                ]
-                if lower_roles:
-                    try:
-                        await member.remove_roles(*lower_roles, reason="Level sync (non-stacking cleanup)")
-                        removed_roles = lower_roles
-                    except:
-                        pass
-
-                if added_role or removed_roles:
-                    updated += 1
-
-            counter += 1
-            if counter % batch_size == 0:
-                await asyncio.sleep(sleep_time)
-
-        embed.description = f"<:slain_approve:1392318903325036635> Synced roles for **{updated}** users"
-        embed.set_footer(text="")
+        embed.description = f"<:slain_approve:1392318903325036635> Synced roles for **{job.updated}** users"
+        if job.failed:
+            embed.description += f"\n-# *Failed to update **{job.failed}** users*"
         await msg.edit(embed=embed)
 
 
@@ -304,6 +233,7 @@ class Leveling(Cog):
             VALUES ($1, $2, $3)
             ON CONFLICT (guild_id) DO NOTHING
         """, ctx.guild.id, ctx.channel.id, "{user.mention} leveled up to level **{level}**{level.reward_append}")
+        self.settings.invalidate(ctx.guild.id)
 
         await ctx.approve("Leveling has been **enabled**")
 
@@ -331,6 +261,7 @@ class Leveling(Cog):
             "UPDATE leveling_settings SET speed = $1 WHERE guild_id = $2",
             rate, ctx.guild.id
         )
+        self.settings.invalidate(ctx.guild.id)
 
         await ctx.approve(f"Leveling set to **x{rate} speed**")
 
@@ -340,33 +271,25 @@ class Leveling(Cog):
         """
         View the highest levels in the server
         """
-        row = await self.bot.pool.fetchrow(
-            "SELECT enabled FROM leveling_settings WHERE guild_id = $1",
-            ctx.guild.id
-        )
-
-        if not row or not row["enabled"]:
+        settings = await self.settings.get(ctx.guild.id)
+        if not settings.enabled:
             return await ctx.warn("Leveling is currently **disabled** in this server")
 
-        rows = await self.bot.pool.fetch(
-            """
-            SELECT user_id, xp, level
-            FROM user_levels
-            WHERE guild_id = $1
-            ORDER BY xp DESC
-            LIMIT 50
-            """,
-            ctx.guild.id
-        )
-
-        if not rows:
+        board = await self.leaderboards.get(ctx.guild.id)
+        for user_id, xp, level in self.ledger.unflushed(ctx.guild.id):
+            board.set(user_id, xp, level)
+        if not board:
             return await ctx.warn("No level data found for this server")
 
-        entries = []
-        for i, row in enumerate(rows, start=1):
-            user = ctx.guild.get_member(row["user_id"]) or await self.bot.fetch_user(row["user_id"])
-            tag = user.name if not hasattr(user, "mention") else user.mention
-            entries.append(f"{tag} — Level `{row['level']}` • **({row['xp']:,} XP)**")
+        # Only the first page waits on name lookups; the rest are fetched
+        # in the background for the next view.
+        rows = board.top(LEADERBOARD_SIZE)
+        await self.user_names.resolve(ctx.guild, [user_id for user_id, _, _ in rows[:10]])
+        entries = [
+            f"{self.user_names.name(ctx.guild, user_id)} — Level `{level}` • **({xp:,} XP)**"
+            for user_id, xp, level in rows
+        ]
+        self.user_names.prefetch()
 
         embed = discord.Embed(
             title=f"Levels Leaderboard",
@@ -394,6 +317,7 @@ class Leveling(Cog):
             "UPDATE leveling_settings SET enabled = FALSE WHERE guild_id = $1",
             ctx.guild.id
         )
+        self.settings.invalidate(ctx.guild.id)
 
         await ctx.approve("Leveling system has been **disabled** for this server")
 
@@ -428,11 +352,12 @@ class Leveling(Cog):
                 """,
                 ctx.guild.id, channel.id, default
             )
+            self.settings.invalidate(ctx.guild.id)
             return await ctx.approve(f"Default level up message set to {channel.mention}")
 
         try:
             if "{embed}" in message:
-                _msg, _embed = await build_embed_from_raw(self.bot, ctx, message)
+                parse_script(message, strict=True).render(ctx)
             else:
                 _ = replace_vars(message, ctx)
         except Exception as e:
@@ -446,6 +371,7 @@ class Leveling(Cog):
             """,
             ctx.guild.id, channel.id, message
         )
+        self.settings.invalidate(ctx.guild.id)
 
         await ctx.approve(f"Custom level up message set to {channel.mention}")
 
@@ -478,7 +404,7 @@ class Leveling(Cog):
                 msg_content, embed = await build_embed_from_raw(self.bot, ctx, message)
                 await channel.send(content=msg_content or None, embed=embed)
             else:
-                content = replace_vars(message, ctx)
+                content = await render_vars(message, ctx)
                 await channel.send(content)
         except Exception as e:
             return await ctx.warn(f"Failed to build test message: {e}")
@@ -537,6 +463,7 @@ class Leveling(Cog):
             """,
             ctx.guild.id, level, role_obj.id
         )
+        self.settings.invalidate(ctx.guild.id)
 
         await ctx.approve(f"{role_obj.mention} will now be **granted at level {level}**")
 
@@ -587,6 +514,7 @@ class Leveling(Cog):
             "DELETE FROM level_roles WHERE guild_id = $1 AND role_id = $2",
             ctx.guild.id, role_obj.id
         )
+        self.settings.invalidate(ctx.guild.id)
 
         await ctx.approve(f"Removed Level role for **{role_obj.mention}**")
 
@@ -604,22 +532,25 @@ class Leveling(Cog):
         if not row or not row["enabled"]:
             return await ctx.warn("Leveling is currently **disabled** in this server")
 
-        exists = await self.bot.pool.fetchval(
-            "SELECT 1 FROM user_levels WHERE user_id = $1 AND guild_id = $2",
-            member.id, ctx.guild.id
-        )
+        async with self.ledger.lock:
+            exists = self.ledger.peek(member.id, ctx.guild.id) or await self.bot.pool.fetchval(
+                "SELECT 1 FROM user_levels WHERE user_id = $1 AND guild_id = $2",
+                member.id, ctx.guild.id
+            )
 
-        if not exists:
-            return await ctx.warn(f"{member.mention} has no level data to reset")
+            if not exists:
+                return await ctx.warn(f"{member.mention} has no level data to reset")
 
-        await self.bot.pool.execute(
-            """
-            UPDATE user_levels
-            SET xp = 0, level = 1, last_xp = NULL
-            WHERE user_id = $1 AND guild_id = $2
-            """,
-            member.id, ctx.guild.id
-        )
+            await self.bot.pool.execute(
+                """
+                UPDATE user_levels
+                SET xp = 0, level = 1, last_xp = NULL
+                WHERE user_id = $1 AND guild_id = $2
+                """,
+                member.id, ctx.guild.id
+            )
+            self.ledger.discard(member.id, ctx.guild.id)
+            self.leaderboards.set(ctx.guild.id, member.id, 0, 1)
 
         await ctx.approve(f"Reset level data for {member.mention}. They are now level **1** with **0 XP**")
 
@@ -792,12 +723,14 @@ class Leveling(Cog):
                     "DELETE FROM level_ignores WHERE guild_id = $1 AND type = 'role' AND target_id = $2",
                     ctx.guild.id, role.id
                 )
+                self.settings.invalidate(ctx.guild.id)
                 return await ctx.approve(f"No longer ignoring XP for: {role.mention}")
             else:
                 await self.bot.pool.execute(
                     "INSERT INTO level_ignores (guild_id, type, target_id) VALUES ($1, 'role', $2)",
                     ctx.guild.id, role.id
                 )
+                self.settings.invalidate(ctx.guild.id)
                 return await ctx.approve(f"Now **ignoring XP** from: {role.mention}")
 
         elif channel:
@@ -807,12 +740,14 @@ class Leveling(Cog):
                     "DELETE FROM level_ignores WHERE guild_id = $1 AND type = 'channel' AND target_id = $2",
                     ctx.guild.id, channel.id
                 )
+                self.settings.invalidate(ctx.guild.id)
                 return await ctx.approve(f"No longer ignoring XP for: {channel.mention}")
             else:
                 await self.bot.pool.execute(
                     "INSERT INTO level_ignores (guild_id, type, target_id) VALUES ($1, 'channel', $2)",
                     ctx.guild.id, channel.id
                 )
+                self.settings.invalidate(ctx.guild.id)
                 return await ctx.approve(f"Now **ignoring XP** from: {channel.mention}")
 
         return await ctx.warn("No matching **channel or role** was found")
@@ -850,6 +785,7 @@ class Leveling(Cog):
             """,
             ctx.guild.id, new
         )
+        self.settings.invalidate(ctx.guild.id)
 
         if new:
             return await ctx.approve("Users will now **keep previous roles** when receiving new level up roles")
@@ -868,6 +804,7 @@ class Leveling(Cog):
         await self.bot.pool.execute("DELETE FROM level_roles WHERE guild_id = $1", ctx.guild.id)
         await self.bot.pool.execute("DELETE FROM level_ignores WHERE guild_id = $1", ctx.guild.id)
         await self.bot.pool.execute("DELETE FROM level_messages WHERE guild_id = $1", ctx.guild.id)
+        self.settings.invalidate(ctx.guild.id)
         await ctx.approve("All leveling **configuration settings** have been reset for this server")
 
     @levels.command(name="resetguild", usage='levels resetguild')
@@ -877,7 +814,10 @@ class Leveling(Cog):
         """
         Reset all leveling data for all users in the server
         """
-        await self.bot.pool.execute("DELETE FROM user_levels WHERE guild_id = $1", ctx.guild.id)
+        async with self.ledger.lock:
+            await self.bot.pool.execute("DELETE FROM user_levels WHERE guild_id = $1", ctx.guild.id)
+            self.ledger.discard_guild(ctx.guild.id)
+            self.leaderboards.discard(ctx.guild.id)
         await ctx.approve("All **user level data** has been reset for this server")
 
 
@@ -899,15 +839,18 @@ class Leveling(Cog):
             return await ctx.warn("Leveling is currently **disabled** in this server.")
 
         xp = self.manager.xp_for_level(level)
-        await self.bot.pool.execute(
-            """
-            INSERT INTO user_levels (user_id, guild_id, xp, level, last_xp)
-            VALUES ($1, $2, $3, $4, $5)
-            ON CONFLICT (user_id, guild_id)
-            DO UPDATE SET xp = $3, level = $4, last_xp = $5
-            """,
-            member.id, ctx.guild.id, xp, level, datetime.utcnow()
-        )
+        async with self.ledger.lock:
+            await self.bot.pool.execute(
+                """
+                INSERT INTO user_levels (user_id, guild_id, xp, level, last_xp)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (user_id, guild_id)
+                DO UPDATE SET xp = $3, level = $4, last_xp = $5
+                """,
+                member.id, ctx.guild.id, xp, level, datetime.utcnow()
+            )
+            self.ledger.discard(member.id, ctx.guild.id)
+            self.leaderboards.set(ctx.guild.id, member.id, xp, level)
         await ctx.approve(f"Set {member.mention}'s level to **{level}** with **{xp:,} XP**")
 
 async def setup(bot):
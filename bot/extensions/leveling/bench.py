@@ -0,0 +1,52 @@
+"""
+Check and time ``level_from_xp`` against the original level-by-level loop.
+
+    python -m bot.extensions.leveling.bench --cap 5000
+"""
+
+from argparse import ArgumentParser
+from timeit import timeit
+
+from .core import level_from_xp, xp_for_level
+
+
+def loop_level_from_xp(xp: int) -> int:
+    level = 1
+    while xp >= xp_for_level(level + 1):
+        level += 1
+    return level
+
+
+def verify(cap: int) -> int:
+    """Compare both implementations around every threshold up to ``cap``."""
+
+    checked = 0
+    for level in range(1, cap + 1):
+        threshold = xp_for_level(level)
+        for xp in (threshold - 1, threshold, threshold + 1):
+            expected = loop_level_from_xp(xp)
+            actual = level_from_xp(xp)
+            if actual != expected:
+                raise AssertionError(f"xp={xp}: expected level {expected}, got {actual}")
+            checked += 1
+    return checked
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cap", type=int, default=2000, help="highest level to verify")
+    parser.add_argument("--number", type=int, default=200, help="timing iterations")
+    args = parser.parse_args()
+
+    checked = verify(args.cap)
+    print(f"level_from_xp matches the loop for {checked:,} XP values up to level {args.cap:,}")
+
+    samples = [xp_for_level(level) + 7 for level in range(1, args.cap + 1, max(1, args.cap // 50))]
+    for name, func in (("loop", loop_level_from_xp), ("table", level_from_xp)):
+        elapsed = timeit(lambda: [func(xp) for xp in samples], number=args.number)
+        per_call = elapsed / (args.number * len(samples)) * 1e6
+        print(f"{name:>5}: {per_call:,.3f} µs per lookup")
+
+
+if __name__ == "__main__":
+    main()
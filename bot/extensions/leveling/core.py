@@ -1,6 +1,10 @@
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
-from collections import defaultdict, deque
+from math import isqrt
+from time import monotonic
+from typing import Optional, Tuple
 import random
 
 
@@ -14,44 +18,149 @@ SPEED_MAP = {
 
 DEFAULT_SPEED = 3
 XP_COOLDOWN_SECONDS = 60
+LEADERBOARD_SIZE = 250
+# Levels covered by the threshold table; higher levels use the closed form.
+THRESHOLD_LEVELS = 1000
+
+
+def xp_for_level(level: int) -> int:
+    if level <= 1:
+        return 0
+    return 15 * ((level - 1) ** 2) + 60 * (level - 1) + 100
+
+
+# THRESHOLDS[i] is the total XP needed to reach level i + 1.
+THRESHOLDS = array("q", (xp_for_level(level) for level in range(1, THRESHOLD_LEVELS + 1)))
+
+
+def level_from_xp(xp: int) -> int:
+    """Highest level whose threshold is at or below ``xp``, never below 1."""
+
+    if xp < THRESHOLDS[-1]:
+        return max(1, bisect_right(THRESHOLDS, xp))
+
+    # Invert 15n^2 + 60n + 100 <= xp with n = level - 1, then correct
+    # the integer square root estimate by at most a step either way.
+    n = (isqrt(60 * xp - 2400) - 60) // 30
+    while xp_for_level(n + 2) <= xp:
+        n += 1
+    while n > 0 and xp_for_level(n + 1) > xp:
+        n -= 1
+    return n + 1
+
+
+class SpamTracker:
+    """
+    Per (guild, user) ring buffers of recent message times.
+
+    Every tracked key owns ``window`` float slots in one preallocated
+    array. Keys are kept in least-recently-used order: once ``capacity``
+    keys are live the oldest is recycled, and keys idle longer than
+    ``interval`` are swept since they can no longer count as spam.
+    """
+
+    def __init__(self, capacity: int = 100_000, window: int = 5, interval: float = 10.0):
+        self.capacity = capacity
+        self.window = window
+        self.interval = interval
+        self.times = array("d", bytes(8 * capacity * window))
+        self.heads = array("B", bytes(capacity))
+        self.counts = array("B", bytes(capacity))
+        self.slots: OrderedDict[Tuple[int, int], int] = OrderedDict()
+        self.free = list(range(capacity - 1, -1, -1))
+        self.evictions = 0
+        self.swept = 0
+        self._last_sweep = monotonic()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _allocate(self, key: Tuple[int, int]) -> int:
+        if self.free:
+            slot = self.free.pop()
+        else:
+            _, slot = self.slots.popitem(last=False)
+            self.evictions += 1
+
+        self.heads[slot] = 0
+        self.counts[slot] = 0
+        self.slots[key] = slot
+        return slot
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        now = monotonic() if now is None else now
+        removed = 0
+        while self.slots:
+            key, slot = next(iter(self.slots.items()))
+            newest = self.times[slot * self.window + (self.heads[slot] - 1) % self.window]
+            if now - newest < self.interval:
+                break
+            del self.slots[key]
+            self.free.append(slot)
+            removed += 1
+
+        self.swept += removed
+        self._last_sweep = now
+        return removed
+
+    def hit(self, guild_id: int, user_id: int) -> bool:
+        """Record a message and return whether the user is spamming."""
+
+        now = monotonic()
+        if now - self._last_sweep >= self.interval:
+            self.sweep(now)
+
+        key = (guild_id, user_id)
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self._allocate(key)
+        else:
+            self.slots.move_to_end(key)
+
+        base = slot * self.window
+        head = self.heads[slot]
+        self.times[base + head] = now
+        head = (head + 1) % self.window
+        self.heads[slot] = head
+        if self.counts[slot] < self.window:
+            self.counts[slot] += 1
+            if self.counts[slot] < self.window:
+                return False
+
+        # With a full buffer the head points at the oldest timestamp.
+        return now - self.times[base + head] < self.interval
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "live": len(self.slots),
+            "capacity": self.capacity,
+            "evictions": self.evictions,
+            "swept": self.swept,
+        }
+
 
 class LevelManager:
     def __init__(self, pool):
         self.pool = pool
-        self.spam_tracker = defaultdict(lambda: deque(maxlen=5))  # last 5 messages per user
+        self.spam_tracker = SpamTracker()
 
     def xp_for_level(self, level: int) -> int:
-        if level <= 1:
-            return 0
-        return 15 * ((level - 1) ** 2) + 60 * (level - 1) + 100
+        return xp_for_level(level)
 
     def generate_xp(self, speed: int = DEFAULT_SPEED) -> int:
         base = random.randint(1, 8)
         return int(base * SPEED_MAP.get(speed, 0.3))
 
-    async def get_user_data(self, user_id: int, guild_id: int):
-        return await self.pool.fetchrow(
-            "SELECT xp, level, last_xp FROM user_levels WHERE user_id = $1 AND guild_id = $2",
-            user_id, guild_id
-        )
-
     def on_xp_cooldown(self, last_xp_time: Optional[datetime]) -> bool:
         if not last_xp_time:
             return False
         return (datetime.utcnow() - last_xp_time).total_seconds() < XP_COOLDOWN_SECONDS
 
     def get_level_from_xp(self, xp: int) -> int:
-        level = 1
-        while xp >= self.xp_for_level(level + 1):
-            level += 1
-        return level
-
-    def is_spamming(self, user_id: int) -> bool:
-        now = datetime.utcnow()
-        history = self.spam_tracker[user_id]
-        history.append(now)
+        return level_from_xp(xp)
 
-        return len(history) >= 5 and (now - history[0]).total_seconds() < 10
+    def is_spamming(self, guild_id: int, user_id: int) -> bool:
+        return self.spam_tracker.hit(guild_id, user_id)
 
     def build_progress_bar(
         self,
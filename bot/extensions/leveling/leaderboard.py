@@ -0,0 +1,227 @@
+import asyncio
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import discord
+
+# (-xp, user_id), so ascending order is the leaderboard order and ties
+# fall back to the lower user id.
+BoardKey = Tuple[int, int]
+
+
+class Rank(NamedTuple):
+    position: int
+    total: int
+
+    @property
+    def percentile(self) -> float:
+        """Share of the guild at or above this position, as a percentage."""
+
+        return self.position / self.total * 100
+
+    @property
+    def top(self) -> str:
+        """``percentile`` for display, never shown below 0.1%."""
+
+        return f"{max(self.percentile, 0.1):.1f}%"
+
+
+class GuildBoard:
+    """One guild's user_levels rows kept sorted by XP."""
+
+    __slots__ = ("keys", "rows")
+
+    def __init__(self, rows: Iterable[Tuple[int, int, int]] = ()):
+        # user_id -> (xp, level)
+        self.rows: Dict[int, Tuple[int, int]] = {}
+        for user_id, xp, level in rows:
+            self.rows[user_id] = (xp, level)
+        self.keys: List[BoardKey] = sorted((-xp, user_id) for user_id, (xp, _) in self.rows.items())
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def set(self, user_id: int, xp: int, level: int) -> None:
+        old = self.rows.get(user_id)
+        self.rows[user_id] = (xp, level)
+        if old and old[0] == xp:
+            return
+        if old:
+            del self.keys[bisect_left(self.keys, (-old[0], user_id))]
+        insort(self.keys, (-xp, user_id))
+
+    def remove(self, user_id: int) -> None:
+        if old := self.rows.pop(user_id, None):
+            del self.keys[bisect_left(self.keys, (-old[0], user_id))]
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based position of ``user_id``, or None when it has no row."""
+
+        if not (row := self.rows.get(user_id)):
+            return None
+        return bisect_left(self.keys, (-row[0], user_id)) + 1
+
+    def standing(self, user_id: int) -> Optional[Rank]:
+        position = self.rank(user_id)
+        return Rank(position, len(self.keys)) if position else None
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[int, int, int]]:
+        return [
+            (user_id, -neg_xp, self.rows[user_id][1])
+            for neg_xp, user_id in self.keys[offset:offset + limit]
+        ]
+
+
+class Leaderboards:
+    """
+    GuildBoard per recently used guild.
+
+    A board is loaded with one query the first time a guild asks for it
+    and is then kept current from XP ledger flushes and the commands that
+    write user_levels directly. At most ``maxsize`` boards are held; the
+    least recently used is dropped first and reloaded when needed.
+    """
+
+    def __init__(self, pool, maxsize: int = 500):
+        self.pool = pool
+        self.maxsize = maxsize
+        self.boards: OrderedDict[int, GuildBoard] = OrderedDict()
+        self._pending: Dict[int, asyncio.Task] = {}
+
+    async def get(self, guild_id: int) -> GuildBoard:
+        if (board := self.boards.get(guild_id)) is not None:
+            self.boards.move_to_end(guild_id)
+            return board
+
+        task = self._pending.get(guild_id)
+        if not task:
+            task = self._pending[guild_id] = asyncio.create_task(self._load(guild_id))
+            task.add_done_callback(lambda _: self._pending.pop(guild_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, guild_id: int) -> GuildBoard:
+        rows = await self.pool.fetch(
+            "SELECT user_id, xp, level FROM user_levels WHERE guild_id = $1",
+            guild_id
+        )
+        board = self.boards[guild_id] = GuildBoard(
+            (row["user_id"], row["xp"] or 0, row["level"]) for row in rows
+        )
+        while len(self.boards) > self.maxsize:
+            self.boards.popitem(last=False)
+        return board
+
+    def peek(self, guild_id: int) -> Optional[GuildBoard]:
+        return self.boards.get(guild_id)
+
+    async def rank(
+        self,
+        guild_id: int,
+        user_id: int,
+        xp: Optional[int] = None,
+        level: Optional[int] = None,
+    ) -> Optional[Rank]:
+        """
+        Rank of a user within their guild. Passing the user's live ``xp``
+        and ``level`` folds in XP the ledger has not flushed yet.
+        """
+
+        board = await self.get(guild_id)
+        if xp is not None:
+            board.set(user_id, xp, level)
+        return board.standing(user_id)
+
+    def peek_rank(self, guild_id: int, user_id: int) -> Optional[Rank]:
+        """Rank from an already loaded board, without touching the database."""
+
+        if (board := self.boards.get(guild_id)) is not None:
+            return board.standing(user_id)
+        return None
+
+    def apply(self, batch: Iterable[tuple]) -> None:
+        """Fold flushed ``(user_id, guild_id, xp, level, ...)`` rows into loaded boards."""
+
+        for user_id, guild_id, xp, level, *_ in batch:
+            if (board := self.boards.get(guild_id)) is not None:
+                board.set(user_id, xp, level)
+
+    def set(self, guild_id: int, user_id: int, xp: int, level: int) -> None:
+        if (board := self.boards.get(guild_id)) is not None:
+            board.set(user_id, xp, level)
+
+    def discard(self, guild_id: int) -> None:
+        self.boards.pop(guild_id, None)
+
+
+class UserNames:
+    """
+    Bounded id -> name cache for leaderboard users the bot cannot see.
+
+    ``resolve`` fetches a batch of missing names a few at a time. ``name``
+    never waits: an unknown id is shown as a raw mention and queued, and
+    ``prefetch`` fetches the queue in the background so the next view
+    shows the name instead.
+    """
+
+    def __init__(self, bot, maxsize: int = 10_000, concurrency: int = 5):
+        self.bot = bot
+        self.maxsize = maxsize
+        self.names: OrderedDict[int, str] = OrderedDict()
+        self.queued: Set[int] = set()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+
+    def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _known(self, guild: discord.Guild, user_id: int) -> bool:
+        return bool(guild.get_member(user_id) or self.bot.get_user(user_id)) or user_id in self.names
+
+    def name(self, guild: discord.Guild, user_id: int) -> str:
+        """Mention members, and name anyone cached by discord.py or here."""
+
+        if guild.get_member(user_id):
+            return f"<@{user_id}>"
+        if user := self.bot.get_user(user_id):
+            return user.name
+        if (name := self.names.get(user_id)) is not None:
+            self.names.move_to_end(user_id)
+            return name
+
+        self.queued.add(user_id)
+        return f"<@{user_id}>"
+
+    async def _fetch(self, user_id: int) -> None:
+        async with self._semaphore:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                name = f"Unknown User ({user_id})"
+            except discord.HTTPException:
+                return
+            else:
+                name = user.name
+
+        self.names[user_id] = name
+        while len(self.names) > self.maxsize:
+            self.names.popitem(last=False)
+
+    async def resolve(self, guild: discord.Guild, user_ids: Iterable[int]) -> None:
+        missing = [user_id for user_id in user_ids if not self._known(guild, user_id)]
+        await asyncio.gather(*(self._fetch(user_id) for user_id in missing))
+
+    def prefetch(self) -> None:
+        if self.queued and not self._task:
+            self._task = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        try:
+            while self.queued:
+                batch = list(self.queued)
+                self.queued.clear()
+                await asyncio.gather(*(self._fetch(user_id) for user_id in batch if user_id not in self.names))
+        finally:
+            self._task = None
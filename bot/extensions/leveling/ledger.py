@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = getLogger(__name__)
+
+LedgerKey = Tuple[int, int]
+
+
+class LedgerEntry:
+    """In-memory copy of a user_levels row."""
+
+    __slots__ = ("xp", "level", "last_xp", "dirty")
+
+    def __init__(self, xp: int = 0, level: int = 1, last_xp: Optional[datetime] = None):
+        self.xp = xp
+        self.level = level
+        self.last_xp = last_xp
+        self.dirty = False
+
+
+class XPLedger:
+    """
+    Write-behind store for user_levels.
+
+    Rows are read once and then served from memory. Awards only mark an
+    entry dirty; dirty entries are written in one ``executemany`` every
+    ``flush_interval`` seconds and when the cog unloads. Clean entries
+    idle for longer than ``idle_ttl`` are dropped after a flush.
+    ``on_flush`` receives each batch once it has been written.
+
+    Flushes hold ``lock``. Commands that write user_levels directly take
+    it too and ``discard`` the entries they replace before releasing it,
+    so an in-flight flush can never land on top of their write.
+    """
+
+    def __init__(
+        self,
+        pool,
+        flush_interval: float = 30.0,
+        idle_ttl: timedelta = timedelta(minutes=30),
+        on_flush: Optional[Callable[[List[tuple]], None]] = None,
+    ):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.idle_ttl = idle_ttl
+        self.on_flush = on_flush
+        self.entries: Dict[LedgerKey, LedgerEntry] = {}
+        self.lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if not self._flush_task:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def get(self, user_id: int, guild_id: int) -> LedgerEntry:
+        key = (user_id, guild_id)
+        if entry := self.entries.get(key):
+            return entry
+
+        record = await self.pool.fetchrow(
+            "SELECT xp, level, last_xp FROM user_levels WHERE user_id = $1 AND guild_id = $2",
+            user_id, guild_id
+        )
+        entry = LedgerEntry(record["xp"], record["level"], record["last_xp"]) if record else LedgerEntry()
+        # Another message may have loaded the row while we were waiting.
+        return self.entries.setdefault(key, entry)
+
+    def peek(self, user_id: int, guild_id: int) -> Optional[LedgerEntry]:
+        return self.entries.get((user_id, guild_id))
+
+    def update(self, entry: LedgerEntry, xp: int, level: int, last_xp: datetime) -> None:
+        entry.xp = xp
+        entry.level = level
+        entry.last_xp = last_xp
+        entry.dirty = True
+
+    def unflushed(self, guild_id: int) -> List[Tuple[int, int, int]]:
+        """``(user_id, xp, level)`` for one guild's entries not yet written."""
+
+        return [
+            (user_id, entry.xp, entry.level)
+            for (user_id, entry_guild), entry in self.entries.items()
+            if entry_guild == guild_id and entry.dirty
+        ]
+
+    def discard(self, user_id: int, guild_id: int) -> None:
+        """Forget a user, including unflushed XP, after a direct write."""
+
+        self.entries.pop((user_id, guild_id), None)
+
+    def discard_guild(self, guild_id: int) -> None:
+        for key in [key for key in self.entries if key[1] == guild_id]:
+            del self.entries[key]
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error("Failed to flush XP ledger", exc_info=exc)
+
+    async def flush(self) -> int:
+        async with self.lock:
+            return await self._flush()
+
+    async def _flush(self) -> int:
+        cutoff = datetime.utcnow() - self.idle_ttl
+        batch = []
+        for (user_id, guild_id), entry in list(self.entries.items()):
+            if entry.dirty:
+                batch.append((user_id, guild_id, entry.xp, entry.level, entry.last_xp))
+                entry.dirty = False
+            elif not entry.last_xp or entry.last_xp < cutoff:
+                del self.entries[(user_id, guild_id)]
+
+        if not batch:
+            return 0
+
+        try:
+            await self.pool.executemany(
+                """
+                INSERT INTO user_levels (user_id, guild_id, xp, level, last_xp)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (user_id, guild_id)
+                DO UPDATE SET xp = $3, level = $4, last_xp = $5
+                """,
+                batch
+            )
+        except Exception:
+            for user_id, guild_id, *_ in batch:
+                if entry := self.entries.get((user_id, guild_id)):
+                    entry.dirty = True
+            raise
+
+        if self.on_flush:
+            self.on_flush(batch)
+        return len(batch)
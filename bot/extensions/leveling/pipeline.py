@@ -0,0 +1,147 @@
+import asyncio
+from logging import getLogger
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import discord
+
+from ..embeds import replace_vars, build_embed_from_raw
+from .settings import GuildSettings
+from .sync import target_roles
+
+logger = getLogger(__name__)
+
+Announcement = Tuple[str, Optional[discord.Embed]]
+
+
+class LevelUp(NamedTuple):
+    message: discord.Message
+    level: int
+    xp: int
+    settings: GuildSettings
+
+
+class LevelUpPipeline:
+    """
+    Background handling of level-ups.
+
+    ``push`` only enqueues, so the message listener never waits on
+    Discord. Workers apply the reward as a single role edit and render
+    the announcement. Announcements are then queued per channel, and
+    whatever piled up while the previous send was in flight goes out
+    together in one message.
+    """
+
+    def __init__(self, bot, leaderboards, workers: int = 2, maxsize: int = 10_000):
+        self.bot = bot
+        self.leaderboards = leaderboards
+        self.workers = workers
+        self.queue: asyncio.Queue[LevelUp] = asyncio.Queue(maxsize)
+        self.outboxes: Dict[int, List[Announcement]] = {}
+        self.senders: Dict[int, asyncio.Task] = {}
+        self.dropped = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        for task in (*self._tasks, *self.senders.values()):
+            task.cancel()
+        self._tasks = []
+        self.senders.clear()
+        self.outboxes.clear()
+
+    def push(self, event: LevelUp) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _worker(self) -> None:
+        while True:
+            event = await self.queue.get()
+            try:
+                await self._reward(event)
+                await self._announce(event)
+            except Exception as exc:
+                logger.error(f"Failed to process level-up in {event.message.guild.id}", exc_info=exc)
+            finally:
+                self.queue.task_done()
+
+    async def _reward(self, event: LevelUp) -> None:
+        member = event.message.author
+        guild = member.guild
+        rewards = {level: guild.get_role(role_id) for level, role_id in event.settings.rewards.items()}
+        roles = target_roles(member, event.level, rewards, event.settings.stack_roles)
+        if roles is None:
+            return
+
+        try:
+            await member.edit(roles=roles, reason="Level-up reward")
+        except discord.HTTPException:
+            pass
+
+    async def _announce(self, event: LevelUp) -> None:
+        settings = event.settings
+        if not settings.message:
+            return
+
+        message = event.message
+        channel = message.guild.get_channel(settings.message_channel_id)
+        if not channel:
+            return
+
+        reward = message.guild.get_role(settings.rewards.get(event.level, 0))
+        content = settings.message
+        extra = {
+            "level": event.level,
+            "xp": event.xp,
+            "level.reward": reward.name if reward else "",
+            "level.reward_mention": reward.mention if reward else "",
+            "level.reward_append": f" and earned {reward.mention}!" if reward else ""
+        }
+        if "{level.rank}" in content:
+            rank = await self.leaderboards.rank(message.guild.id, message.author.id, event.xp, event.level)
+            extra["level.rank"] = f"{rank.position:,}" if rank else "N/A"
+
+        ctx = await self.bot.get_context(message)
+        embed = None
+        if "{embed}" in content:
+            try:
+                text, embed = await build_embed_from_raw(self.bot, ctx, content, extra=extra)
+            except Exception:
+                text = replace_vars(content, ctx, extra=extra).replace("\\n", "\n")
+        else:
+            text = replace_vars(content, ctx, extra=extra).replace("\\n", "\n")
+
+        self.outboxes.setdefault(channel.id, []).append((text or "", embed))
+        if channel.id not in self.senders:
+            self.senders[channel.id] = asyncio.create_task(self._sender(channel))
+
+    async def _sender(self, channel: discord.abc.Messageable) -> None:
+        try:
+            while outbox := self.outboxes.get(channel.id):
+                content, embeds = [], []
+                # Take announcements while they still fit in one message.
+                while outbox:
+                    text, embed = outbox[0]
+                    if content and len("\n".join(content + [text])) > 2000:
+                        break
+                    if embed and len(embeds) >= 10:
+                        break
+                    outbox.pop(0)
+                    if text:
+                        content.append(text)
+                    if embed:
+                        embeds.append(embed)
+
+                if not content and not embeds:
+                    continue
+                try:
+                    await channel.send(content="\n".join(content)[:2000] or None, embeds=embeds)
+                except discord.HTTPException:
+                    pass
+        finally:
+            self.outboxes.pop(channel.id, None)
+            self.senders.pop(channel.id, None)
@@ -0,0 +1,95 @@
+import asyncio
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+from .core import DEFAULT_SPEED
+
+
+@dataclass(frozen=True)
+class GuildSettings:
+    """Immutable snapshot of a guild's leveling configuration."""
+
+    enabled: bool = False
+    speed: int = DEFAULT_SPEED
+    stack_roles: bool = False
+    ignored_channels: frozenset = frozenset()
+    ignored_roles: frozenset = frozenset()
+    # level -> role_id
+    rewards: Mapping[int, int] = field(default_factory=lambda: MappingProxyType({}))
+    message_channel_id: Optional[int] = None
+    message: Optional[str] = None
+
+
+DISABLED = GuildSettings()
+
+
+class SettingsCache:
+    """
+    Per-guild GuildSettings snapshots.
+
+    A snapshot is built on first use and kept until ``invalidate`` is
+    called by a command that writes the guild's configuration. Guilds
+    without leveling are cached too, so their messages cost nothing.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.snapshots: Dict[int, GuildSettings] = {}
+        # Bumped on every invalidation so a build racing a write is discarded.
+        self._versions: Dict[int, int] = {}
+        # Builds in flight, shared by concurrent misses for the same guild.
+        self._pending: Dict[int, asyncio.Task] = {}
+
+    def invalidate(self, guild_id: int) -> None:
+        self.snapshots.pop(guild_id, None)
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+
+    async def get(self, guild_id: int) -> GuildSettings:
+        if (snapshot := self.snapshots.get(guild_id)) is not None:
+            return snapshot
+
+        task = self._pending.get(guild_id)
+        if not task:
+            task = self._pending[guild_id] = asyncio.create_task(self._load(guild_id))
+            task.add_done_callback(lambda _: self._pending.pop(guild_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, guild_id: int) -> GuildSettings:
+        version = self._versions.get(guild_id, 0)
+        snapshot = await self._build(guild_id)
+        if self._versions.get(guild_id, 0) == version:
+            self.snapshots[guild_id] = snapshot
+        return snapshot
+
+    async def _build(self, guild_id: int) -> GuildSettings:
+        row = await self.pool.fetchrow(
+            "SELECT speed, enabled, stack_roles FROM leveling_settings WHERE guild_id = $1",
+            guild_id
+        )
+        if not row or not row["enabled"]:
+            return DISABLED
+
+        ignored = await self.pool.fetch(
+            "SELECT type, target_id FROM level_ignores WHERE guild_id = $1",
+            guild_id
+        )
+        rewards = await self.pool.fetch(
+            "SELECT level, role_id FROM level_roles WHERE guild_id = $1",
+            guild_id
+        )
+        message = await self.pool.fetchrow(
+            "SELECT channel_id, message FROM level_messages WHERE guild_id = $1",
+            guild_id
+        )
+
+        return GuildSettings(
+            enabled=True,
+            speed=row["speed"] or DEFAULT_SPEED,
+            stack_roles=bool(row["stack_roles"]),
+            ignored_channels=frozenset(r["target_id"] for r in ignored if r["type"] == "channel"),
+            ignored_roles=frozenset(r["target_id"] for r in ignored if r["type"] == "role"),
+            rewards=MappingProxyType({r["level"]: r["role_id"] for r in rewards}),
+            message_channel_id=message["channel_id"] if message else None,
+            message=message["message"] if message else None,
+        )
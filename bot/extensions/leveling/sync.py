@@ -0,0 +1,148 @@
+import asyncio
+from collections import deque
+from logging import getLogger
+from typing import Awaitable, Callable, Deque, Dict, List, Mapping, Optional, Set
+
+import discord
+
+logger = getLogger(__name__)
+
+
+def target_roles(
+    member: discord.Member,
+    level: int,
+    rewards: Mapping[int, discord.Role],
+    stack_roles: bool,
+) -> Optional[List[discord.Role]]:
+    """
+    Return the member's full role list after applying level rewards, or
+    None when nothing would change.
+
+    With stacking every reward at or below the level is granted. Without
+    it only the highest one is, and lower rewards are taken away.
+    """
+
+    top_role = member.guild.me.top_role
+    held = set(member.roles)
+    eligible = [
+        (lvl, role) for lvl, role in rewards.items()
+        if role and lvl <= level and role < top_role
+    ]
+    if not eligible:
+        return None
+
+    if stack_roles:
+        add = {role for _, role in eligible} - held
+        remove = set()
+    else:
+        highest_level, highest_role = max(eligible, key=lambda item: item[0])
+        add = {highest_role} - held
+        remove = {
+            role for lvl, role in rewards.items()
+            if role and lvl < highest_level and role in held and role < top_role
+        }
+
+    if not add and not remove:
+        return None
+
+    # The first role is always @everyone, which cannot be sent back.
+    return [role for role in member.roles[1:] if role not in remove] + list(add)
+
+
+class RoleSync:
+    """
+    Bring every member's level roles in line with their stored level.
+
+    Targets are computed in one pass, and only members whose roles differ
+    are queued. Edits go through a small pool of workers.
+
+    A member leaves ``pending`` only once their edit has finished, so an
+    interrupted edit is retried. Jobs live in memory only. Running the
+    command again, after an interruption or a restart, plans from fresh
+    rewards and levels, and members already in line are skipped.
+    """
+
+    def __init__(self, guild: discord.Guild, workers: int = 4):
+        self.guild = guild
+        self.workers = workers
+        self.rewards: Mapping[int, discord.Role] = {}
+        self.levels: Dict[int, int] = {}
+        self.stack_roles = False
+        self.pending: Deque[int] = deque()
+        self.active: Set[int] = set()
+        self.checked = 0
+        self.updated = 0
+        self.failed = 0
+        self.running = False
+
+    def plan(self, rewards: Mapping[int, discord.Role], levels: Dict[int, int], stack_roles: bool) -> None:
+        """Queue every member whose roles differ from their target."""
+
+        self.rewards = rewards
+        self.levels = levels
+        self.stack_roles = stack_roles
+        self.pending = deque(
+            user_id for user_id, level in levels.items()
+            if (member := self.guild.get_member(user_id))
+            and target_roles(member, level, rewards, stack_roles) is not None
+        )
+
+    @property
+    def total(self) -> int:
+        return self.checked + len(self.active) + len(self.pending)
+
+    @property
+    def processed(self) -> int:
+        return self.checked
+
+    @property
+    def finished(self) -> bool:
+        return not self.pending and not self.running
+
+    async def _sync(self, user_id: int) -> None:
+        member = self.guild.get_member(user_id)
+        # Recompute at edit time; roles may have changed since planning.
+        roles = target_roles(member, self.levels[user_id], self.rewards, self.stack_roles) if member else None
+        if roles is None:
+            return
+
+        try:
+            await member.edit(roles=roles, reason="Level sync")
+        except discord.HTTPException as exc:
+            self.failed += 1
+            logger.warning(f"Level sync failed for {user_id} in {self.guild.id}: {exc}")
+        else:
+            self.updated += 1
+
+    async def _worker(self) -> None:
+        while self.pending:
+            user_id = self.pending.popleft()
+            self.active.add(user_id)
+            try:
+                await self._sync(user_id)
+            except BaseException:
+                # Interrupted before the edit finished, so it stays queued.
+                self.pending.appendleft(user_id)
+                raise
+            finally:
+                self.active.discard(user_id)
+            self.checked += 1
+
+    async def run(
+        self,
+        progress: Optional[Callable[["RoleSync"], Awaitable[None]]] = None,
+        interval: float = 5.0,
+    ) -> None:
+        self.running = True
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            while not all(worker.done() for worker in workers):
+                await asyncio.wait(workers, timeout=interval)
+                if progress and self.pending:
+                    await progress(self)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.running = False
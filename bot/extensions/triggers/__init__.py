@@ -1,35 +1,28 @@
 import discord
 import json
 import time
-import asyncio
 from discord import Embed
 from discord.ext.commands import has_permissions, Cog, group, Context
 from discord.ext import commands
 from bot.core import Bot
 from cashews import cache
-from types import SimpleNamespace
 from ...shared.formatter import compact_number
 from ...shared.paginator import Paginator
-from ..embeds import replace_vars, build_embed_from_raw
+from ..embeds import render_vars, build_embed_from_raw, parse_script, ScriptError
 from bot.shared.fakeperms import hybrid_permissions
 from discord import SystemChannelFlags
 
+from .dispatcher import Greeting, GreetingDispatcher, make_fake_ctx
 
-def make_fake_ctx(bot, guild, author, channel):
-    return SimpleNamespace(
-        bot=bot,
-        guild=guild,
-        author=author,
-        channel=channel,
-        clean_prefix=","  # default fallback
-    )
 
 class Welcome(Cog):
-    def __init__(self, bot: Bot) -> None:
+    def __init__(self, bot: Bot, greetings: GreetingDispatcher) -> None:
         self.bot = bot
-        self.last_query_time = {}
-        self.welcome_queues = {}
-        self.welcome_tasks = {}
+        self.greetings = greetings
+
+    async def cog_unload(self) -> None:
+        # Welcome owns the dispatcher shared with Boost and Goodbye.
+        self.greetings.close()
 
     async def get_welcome_message(self, guild_id: int):
         cached_message = await cache.get(f"welcome:{guild_id}")
@@ -48,46 +41,15 @@ class Welcome(Cog):
 
     @Cog.listener()
     async def on_member_join(self, member):
-        guild_id = member.guild.id
-
-        if guild_id not in self.welcome_queues:
-            self.welcome_queues[guild_id] = asyncio.Queue()
-            self.welcome_tasks[guild_id] = self.bot.loop.create_task(self.process_welcome_queue(guild_id))
-
-        await self.welcome_queues[guild_id].put(member)
-
-    async def process_welcome_queue(self, guild_id: int):
-        queue = self.welcome_queues[guild_id]
-        while True:
-            member = await queue.get()
-            try:
-                row = await self.get_welcome_message(guild_id)
-                if not row:
-                    continue
-
-                channel = member.guild.get_channel(row["channel_id"])
-                if not channel:
-                    continue
-
-                ctx = make_fake_ctx(self.bot, member.guild, member, channel)
-                raw = row.get("raw")
-                if not raw:
-                    continue
-
-                if "{embed}" in raw:
-                    try:
-                        message_content, embed = await build_embed_from_raw(self.bot, ctx, raw)
-                        await channel.send(content=message_content or None, embed=embed)
-                    except Exception:
-                        continue
-                else:
-                    content = replace_vars(raw, ctx)
-                    await channel.send(content=content)
+        row = await self.get_welcome_message(member.guild.id)
+        if not row or not row.get("raw"):
+            return
 
-            except Exception as e:
-                print(f"[Welcome Queue Error] {e}")
+        channel = member.guild.get_channel(row["channel_id"])
+        if not channel:
+            return
 
-            await asyncio.sleep(2)
+        self.greetings.push(Greeting("welcome", member, channel, row["raw"]))
 
     @group(name="welcome", usage='welcome')
     async def welcome_group(self, ctx: Context):
@@ -104,6 +66,12 @@ class Welcome(Cog):
         if existing:
             return await ctx.warn("A welcome message is already set for this server.")
 
+        if "{embed}" in raw:
+            try:
+                parse_script(raw, strict=True)
+            except ScriptError as e:
+                return await ctx.warn(str(e))
+
         await self.bot.pool.execute(
             """
             INSERT INTO welcome_messages (guild_id, channel_id, raw)
@@ -154,15 +122,16 @@ class Welcome(Cog):
                 await ctx.warn(f"Failed to build welcome embed: `{e}`")
         else:
             try:
-                content = replace_vars(raw, fake_ctx)
+                content = await render_vars(raw, fake_ctx)
                 await channel.send(content=content)
                 await ctx.approve(f"Welcome message preview sent to {channel.mention}")
             except Exception as e:
                 await ctx.warn(f"Failed to render welcome message: `{e}`")
 
 class Boost(Cog):
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, greetings: GreetingDispatcher):
         self.bot = bot
+        self.greetings = greetings
 
     async def get_boost_message(self, guild_id: int):
         cached = await cache.get(f"boost:{guild_id}")
@@ -208,23 +177,11 @@ class Boost(Cog):
         if not (permissions.send_messages and permissions.embed_links):
             return
 
-        ctx = make_fake_ctx(self.bot, guild, member, channel)
         raw = row.get("raw")
         if not raw:
             return
 
-        if "{embed}" in raw:
-            try:
-                message_content, embed = await build_embed_from_raw(self.bot, ctx, raw)
-                await channel.send(content=message_content or None, embed=embed)
-            except Exception as e:
-                print(f"[Boost Message Error] {e}")
-        else:
-            try:
-                content = replace_vars(raw, ctx)
-                await channel.send(content=content)
-            except Exception as e:
-                print(f"[Boost Message Error] {e}")
+        self.greetings.push(Greeting("boost", member, channel, raw))
 
     @group(name="boost", usage='boost')
     async def boost_group(self, ctx: Context):
@@ -247,6 +204,12 @@ class Boost(Cog):
         if existing:
             return await ctx.warn("A boost message is already set for this server")
 
+        if "{embed}" in raw:
+            try:
+                parse_script(raw, strict=True)
+            except ScriptError as e:
+                return await ctx.warn(str(e))
+
         await self.bot.pool.execute(
             """
             INSERT INTO boost_messages (guild_id, channel_id, raw)
@@ -316,17 +279,16 @@ class Boost(Cog):
                 await ctx.warn(f"Failed to build boost embed: `{e}`")
         else:
             try:
-                content = replace_vars(raw, fake_ctx)
+                content = await render_vars(raw, fake_ctx)
                 await channel.send(content=content)
                 await ctx.approve(f"Boost message preview sent to {channel.mention}")
             except Exception as e:
                 await ctx.warn(f"Failed to render boost message: `{e}`")
 
 class Goodbye(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, greetings: GreetingDispatcher):
         self.bot = bot
-        self.goodbye_queues = {}
-        self.goodbye_tasks = {}
+        self.greetings = greetings
 
     async def get_goodbye_message(self, guild_id: int):
         cached = await cache.get(f"goodbye:{guild_id}")
@@ -345,40 +307,15 @@ class Goodbye(commands.Cog):
 
     @commands.Cog.listener()
     async def on_member_remove(self, member: discord.Member):
-        guild_id = member.guild.id
-
-        if guild_id not in self.goodbye_queues:
-            self.goodbye_queues[guild_id] = asyncio.Queue()
-            self.goodbye_tasks[guild_id] = self.bot.loop.create_task(self.process_goodbye_queue(guild_id))
+        row = await self.get_goodbye_message(member.guild.id)
+        if not row or not row.get("raw"):
+            return
 
-        await self.goodbye_queues[guild_id].put(member)
+        channel = member.guild.get_channel(row["channel_id"])
+        if not channel:
+            return
 
-    async def process_goodbye_queue(self, guild_id: int):
-        queue = self.goodbye_queues[guild_id]
-        while True:
-            member = await queue.get()
-            try:
-                row = await self.get_goodbye_message(guild_id)
-                if not row:
-                    continue
-
-                channel = member.guild.get_channel(row["channel_id"])
-                if not channel:
-                    continue
-
-                ctx = make_fake_ctx(self.bot, member.guild, member, channel)
-                raw = row.get("raw")
-                if not raw:
-                    continue
-
-                try:
-                    message_content, embed = await build_embed_from_raw(self.bot, ctx, raw)
-                    await channel.send(content=message_content or None, embed=embed)
-                except Exception as e:
-                    print(f"[Goodbye Message Error] {e}")
-            except Exception as e:
-                print(f"[Goodbye Queue Outer Error] {e}")
-            await asyncio.sleep(2)
+        self.greetings.push(Greeting("goodbye", member, channel, row["raw"], always_embed=True))
 
     @group(name="goodbye", usage='goodbye')
     async def goodbye_group(self, ctx: Context):
@@ -396,6 +333,12 @@ class Goodbye(commands.Cog):
         if existing:
             return await ctx.warn("A goodbye message is already set for this server")
 
+        if "{embed}" in raw:
+            try:
+                parse_script(raw, strict=True)
+            except ScriptError as e:
+                return await ctx.warn(str(e))
+
         await self.bot.pool.execute(
             """
             INSERT INTO goodbye_messages (guild_id, channel_id, raw)
@@ -446,6 +389,8 @@ class Goodbye(commands.Cog):
 
 
 async def setup(bot: Bot) -> None:
-    await bot.add_cog(Welcome(bot))
-    await bot.add_cog(Boost(bot))
-    await bot.add_cog(Goodbye(bot))
\ No newline at end of file
+    greetings = GreetingDispatcher(bot)
+    greetings.start()
+    await bot.add_cog(Welcome(bot, greetings))
+    await bot.add_cog(Boost(bot, greetings))
+    await bot.add_cog(Goodbye(bot, greetings))
@@ -0,0 +1,169 @@
+import asyncio
+from collections import deque
+from logging import getLogger
+from types import SimpleNamespace
+from typing import Deque, Dict, List, NamedTuple
+
+import discord
+
+from ..embeds import render_vars, build_embed_from_raw
+
+logger = getLogger(__name__)
+
+
+def make_fake_ctx(bot, guild, author, channel):
+    return SimpleNamespace(
+        bot=bot,
+        guild=guild,
+        author=author,
+        channel=channel,
+        clean_prefix=","  # default fallback
+    )
+
+
+class Greeting(NamedTuple):
+    kind: str
+    member: discord.Member
+    channel: discord.TextChannel
+    raw: str
+    # Goodbye messages are always rendered as embed scripts.
+    always_embed: bool = False
+
+
+class GreetingDispatcher:
+    """
+    One send path for welcome, goodbye and boost messages.
+
+    Greetings queue per channel. A fixed pool of workers takes channels
+    round-robin, sending one message per turn, so a busy channel cannot
+    starve the rest. A channel is served by at most one worker at a time,
+    and its queue is dropped once it drains.
+
+    Once ``coalesce_threshold`` or more greetings are waiting in a
+    channel, as in a join raid, consecutive welcomes for the same
+    template go out as a single message for up to ``coalesce_cap``
+    members. A coalesced message lists every member in the user name,
+    id and mention variables. Any other user variable, such as the
+    avatar or join position, comes from the first member only.
+
+    A channel holds about ``channel_limit`` messages' worth of
+    greetings: ``channel_limit`` on their own, or ``coalesce_cap`` times
+    that for welcomes that will be coalesced. The oldest greetings are
+    dropped past that.
+    """
+
+    def __init__(
+        self,
+        bot,
+        workers: int = 8,
+        channel_limit: int = 1000,
+        coalesce_threshold: int = 10,
+        coalesce_cap: int = 25,
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.channel_limit = channel_limit
+        self.coalesce_threshold = coalesce_threshold
+        self.coalesce_cap = coalesce_cap
+        self.channels: Dict[int, Deque[Greeting]] = {}
+        self.ready: asyncio.Queue[int] = asyncio.Queue()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def push(self, greeting: Greeting) -> None:
+        channel_id = greeting.channel.id
+        pending = self.channels.get(channel_id)
+        if pending is None:
+            pending = self.channels[channel_id] = deque()
+            self.ready.put_nowait(channel_id)
+        elif len(pending) >= self._limit(pending, greeting):
+            pending.popleft()
+            self.dropped += 1
+        pending.append(greeting)
+
+    def _limit(self, pending: Deque[Greeting], greeting: Greeting) -> int:
+        # A welcome that will join the batch ahead of it does not cost a
+        # message of its own.
+        last = pending[-1] if pending else None
+        if last and greeting.kind == "welcome" and last.kind == "welcome" and last.raw == greeting.raw:
+            return self.channel_limit * self.coalesce_cap
+        return self.channel_limit
+
+    def depth(self, channel_id: int) -> int:
+        return len(self.channels.get(channel_id, ()))
+
+    def stats(self) -> Dict[str, int]:
+        depths = [len(pending) for pending in self.channels.values()]
+        return {
+            "channels": len(depths),
+            "queued": sum(depths),
+            "deepest": max(depths, default=0),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
+
+    def _take(self, pending: Deque[Greeting]) -> List[Greeting]:
+        depth = len(pending)
+        batch = [pending.popleft()]
+        first = batch[0]
+        if first.kind != "welcome" or depth < self.coalesce_threshold:
+            return batch
+
+        while (
+            pending and len(batch) < self.coalesce_cap
+            and pending[0].kind == "welcome" and pending[0].raw == first.raw
+        ):
+            batch.append(pending.popleft())
+        return batch
+
+    async def _worker(self) -> None:
+        while True:
+            channel_id = await self.ready.get()
+            pending = self.channels.get(channel_id)
+            if pending:
+                await self._send(self._take(pending))
+
+            if pending:
+                self.ready.put_nowait(channel_id)
+            else:
+                self.channels.pop(channel_id, None)
+
+    async def _send(self, batch: List[Greeting]) -> None:
+        greeting = batch[0]
+        member, channel, raw = greeting.member, greeting.channel, greeting.raw
+        ctx = make_fake_ctx(self.bot, member.guild, member, channel)
+
+        extra = None
+        if len(batch) > 1:
+            # One message for the whole batch: user variables list every member.
+            members = [g.member for g in batch]
+            extra = {
+                "user": ", ".join(str(m) for m in members),
+                "user.id": ", ".join(str(m.id) for m in members),
+                "user.mention": ", ".join(m.mention for m in members),
+                "user.name": ", ".join(m.name for m in members),
+                "user.display_name": ", ".join(m.display_name for m in members),
+            }
+
+        try:
+            if greeting.always_embed or "{embed}" in raw:
+                message_content, embed = await build_embed_from_raw(self.bot, ctx, raw, extra=extra)
+                await channel.send(content=message_content or None, embed=embed)
+            else:
+                await channel.send(content=(await render_vars(raw, ctx, extra=extra))[:2000])
+            self.sent += 1
+            self.coalesced += len(batch) - 1
+        except Exception as e:
+            logger.warning(f"Failed to send {greeting.kind} message in {channel.id}: {e}")
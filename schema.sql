@@ -185,12 +185,19 @@ CREATE TABLE IF NOT EXISTS user_levels (
     last_xp TIMESTAMP,
     PRIMARY KEY (user_id, guild_id)
 );
+CREATE INDEX IF NOT EXISTS user_levels_guild_xp_idx ON user_levels (guild_id, xp DESC);
 CREATE TABLE IF NOT EXISTS level_roles (
     guild_id BIGINT NOT NULL,
     level INT NOT NULL,
     role_id BIGINT NOT NULL,
     PRIMARY KEY (guild_id, level)
 );
+CREATE TABLE IF NOT EXISTS level_ignores (
+    guild_id BIGINT NOT NULL,
+    type TEXT NOT NULL,
+    target_id BIGINT NOT NULL,
+    PRIMARY KEY (guild_id, type, target_id)
+);
 CREATE TABLE IF NOT EXISTS level_messages (
     guild_id BIGINT PRIMARY KEY,
     channel_id BIGINT NOT NULL,